@@ -1,6 +1,8 @@
 [Title 0]
 led_start = 50
 led_length = 12
+; tasks belong to [Title 0] unless they set "title = N", each [Title N] can have its own
+; strip with "channel = 1" and "neopixel_pin = 18", the default is channel 2 on pin 13
 
 [left 0]
 led_start = 62
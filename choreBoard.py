@@ -1,26 +1,27 @@
 #!/usr/bin/env python3
 
 # python standard libraries
-import __main__, sys, os, signal, pprint, configparser, argparse, logging, logging.handlers, time, random, copy, geocoder, tempfile
+import __main__, sys, os, signal, pprint, configparser, argparse, logging, logging.handlers, time, random, copy, tempfile, heapq, threading, queue, socket, json, shutil, collections, bisect, re, math, colorsys, atexit, hashlib
 from crontab import CronTab
-from datetime import datetime, timedelta, date
-from time import time, sleep, localtime, mktime, strptime
-from astral import Location
+from datetime import datetime, timedelta, time as dtime
+from dataclasses import dataclass, field, fields
+from time import time, sleep, localtime, mktime, strptime, perf_counter
+from astral import Location, AstralError
 
 # Raspberry Pi specific libraries
-import pigpio
+pigpio = None # imported by main(), or SimulatedPigpio with --simulate
 
 
 #### Global Variables ####
 
 # ws2812svr constants
-ws281x = { 'PWMchannel' : 2,
+ws281x = { 'PWMchannel' : 2, # default channel and pin of a [Title N] without channel and neopixel_pin
            'NeopixelPin' : 13,
            'Brightness' : int(255/4),
            'Invert' : 0,
-           'LedCount' : 0, # will be calculated later, from the INI file
            'LedType' : 1
          }
+strips = {} # channel -> {'NeopixelPin' : pin, 'LedCount' : LEDs}, calculated later from the INI file by loadTasks().
 
 colors = { 'off' : '000000',
            'red' : 'FF0000',
@@ -39,94 +40,993 @@ colors = { 'off' : '000000',
          }
 
 pp = pprint.PrettyPrinter(indent=4) # Setup format for pprint.
-fn = os.path.splitext(os.path.basename(__main__.__file__))[0]
+
+class LazyPformat:
+  ''' log argument that only pretty prints when the record is actually emitted '''
+  __slots__ = ('obj',)
+  def __init__(self, obj):
+    self.obj = obj
+  def __str__(self):
+    return pp.pformat(self.obj)
+
+class LazyStrftime:
+  ''' log argument that only formats the date when the record is actually emitted '''
+  __slots__ = ('date',)
+  def __init__(self, date):
+    self.date = date
+  def __str__(self):
+    return self.date.strftime('%Y-%m-%d %a %H:%M:%S')
+fn = os.path.splitext(os.path.basename(getattr(__main__, '__file__', __file__)))[0]
 args = None
 config = None
 tasks = None
+titles = {} # 'Title N' -> list of its task sections, built by loadTasks().
+pi = None
+clock = None # RealClock, or VirtualClock with --simulate
+
+# event driven scheduler, a heap of upcoming (datetime, section) transitions.
+schedule = []
+scheduled = {} # section -> currently armed time, older heap entries are stale.
+buttonEdges = queue.SimpleQueue() # (gpio_pin, level, tick, currentDate, perf_counter) queued by cbf_button(), or 'reload' by SIGHUP, consumed only by the main loop.
+buttonSections = set() # sections whose button changed since the main loop last ran.
+buttonLevels = {} # gpio_pin -> last level applied by applyButtonEdge(), 0 is pressed.
+buttonTasks = {} # gpio_pin -> list of sections sharing that button, built by loadTasks().
+buttonTiming = {} # gpio_pin -> press and release ticks and the buttonDelay of that button, see pinTiming().
+buttonCallbacks = {} # gpio_pin -> (pigpio callback, glitch) of the armed buttons.
+configRaw = {} # the INI and IO sections as read, before defaults and runtime state, what a reload is diffed against.
+configStamp = None # modification times of the INI and IO files when they were last read.
+compiledConfig = None # the --configCache entry matching the INI and IO files, if there was one
+configCacheVersion = 2 # bump when the cached layout changes
+postFrames = [] # POST frames still to be shown by the scheduler, as its 'POST' section.
+
+def slotted(cls):
+  ''' a dataclass with __slots__ like @dataclass(slots=True), which needs Python 3.10 while Raspbian Buster and Bullseye have 3.7 and 3.9 '''
+  namespace = {key : value for key, value in cls.__dict__.items() if key not in ('__dict__', '__weakref__')}
+  namespace['__slots__'] = tuple(f.name for f in fields(cls))
+  for name in namespace['__slots__']:
+    namespace.pop(name, None) # the defaults are already in the generated __init__()
+  return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+@slotted
+@dataclass
+class Task:
+  ''' a chore compiled once from its config section, and its runtime state '''
+  section: str
+  description: str
+  title: str # its 'Title N' section
+  channel: int # its title's strip
+  gpio_pin: int
+  led_start: int
+  led_length: int
+  glitch: int
+  deadline: str # cron expression
+  grace: timedelta # yellow before the deadline
+  persist: timedelta # red after the deadline
+  crontab: CronTab
+  PendingDueDate: datetime = None
+  PendingGraceDate: datetime = None
+  PendingToLateDate: datetime = None
+  currentColor: str = 'off'
+  state: str = None
+  ButtonPresses: list = field(default_factory=list)
+  ButtonReleases: list = field(default_factory=list)
+  pressCount: int = 0 # accepted presses and releases since start up
+  releaseCount: int = 0
+
+@slotted
+@dataclass
+class Animation:
+  ''' an effect drawn over the frame buffer with --animate, the frame buffer holds the colors it settles on '''
+  effect: str # 'fade', 'pulse' or 'celebrate'
+  ranges: list # (channel, led_start, led_length) drawn over
+  began: datetime
+  color: bytes # faded to or pulsed
+  fromColor: bytes = None # faded from
+
+animations = {} # task section or 'Title N' -> its running Animation, drawn by flush_ws281x().
+fadeSeconds = 0.5
+pulseSeconds = 2 # period of the late pulse, which runs until the task changes color
+celebrateSeconds = 4 # hues chased across a title and its tasks once they are all complete
+nonZeroBytes = re.compile(rb'[^\x00]+')
+
+taskState = ('PendingDueDate', 'PendingGraceDate', 'PendingToLateDate', 'currentColor', 'state', 'ButtonPresses', 'ButtonReleases', 'pressCount', 'releaseCount') # carried over when a reload recompiles a task
+titleState = ('dawn', 'sunset', 'currentColor', 'state', 'listState') # runtime keys of a [Title N] carried over by a reload
+
+# dawn and sunset, computed locally from a location resolved once.
+sunLocation = None # (latitude, longitude)
+sunTimes = {} # date -> (dawn, sunset)
+sunWindowDays = 14 # days computed at a time
+fallbackSun = (dtime(6, 0), dtime(20, 0)) # dawn and sunset used when the location is unknown
+maxIdleSleep = 60 # seconds, upper bound of a wait, so wall clock jumps (NTP) are noticed.
+
+# upcoming deadlines shared by every task with the same schedule, least recently used first.
+# (deadline, grace, persist) -> (start, [(PendingDueDate, PendingGraceDate, PendingToLateDate), ...]) of the
+# occurrences after start, so a lookup between start and the last cached due date is a bisect.
+cronCache = collections.OrderedDict()
+cronCacheSize = 256 # schedules kept
+cronCacheOccurrences = 32 # most occurrences computed per schedule at a time, doubling from 1 while time moves forward
+# deadline -> [due dates of the week after cronWeekStart as timedeltas from it], or None when the schedule does not repeat
+# weekly or is due too often for a week to be worth computing up front. Oldest first.
+cronWeeks = {}
+cronWeeksSize = 1024 # schedules kept, a week is a handful of timedeltas
+cronWeekMost = 7 * 24 # most due dates in a week
+cronWeekStart = datetime(2000, 1, 3) # a Monday, any date would do
+
+# ws2812svr connection, kept open between writes, and the commands queued for the next render.
+# 'pixels' are the frame buffers (channel -> 3 bytes RGB per LED) painted by fill_ws281x(), 'shown' is what
+# ws2812svr was last sent per channel, a channel missing when unknown and its whole strip needs to be repainted.
+# 'overlay', when set, are frames shown instead of 'pixels', e.g. by the POST.
+ledOutput = { 'handle' : None,
+              'batch' : [],
+              'pixels' : {},
+              'overlay' : None,
+              'shown' : None,
+              'isSetup' : False,
+              'recorder' : None # LedRecorder of memory://
+            }
+
+# append-only completion history, lines of "epoch<TAB>kind<TAB>section[<TAB>field...]" where kind is
+# P press, R release, U completion undone by a long press, S state change (state, due epoch),
+# C snapshot (state, due epoch, last release epoch) or X clean shutdown (no section).
+# 'pending' holds lines queued by the callbacks and the main loop until the next flushHistory().
+history = { 'handle' : None,
+            'pending' : collections.deque(),
+            'records' : 0, # lines in the live file, compacted once past historyCompactRecords
+            'dirty' : False, # written since the last fsync
+            'synced' : None # time of the last fsync
+          }
+historyCompactRecords = 10000
+
+class Histogram:
+  ''' latency histogram in seconds, exported with cumulative Prometheus buckets '''
+  __slots__ = ('buckets', 'counts', 'count', 'sum')
+  def __init__(self, buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)):
+    self.buckets = buckets
+    self.counts = [0] * (len(buckets) + 1) # the last one is +Inf
+    self.count = 0
+    self.sum = 0.0
+
+  def observe(self, seconds):
+    self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+    self.count += 1
+    self.sum += seconds
+
+  def cumulative(self):
+    ''' [(upper bound, observations <= bound)], ending with +Inf '''
+    total = 0
+    result = []
+    for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+      total += count
+      result.append((bound, total))
+    return result
+
+# counters served by --statusHttp, plain ints and Histograms updated in place by the main loop and the callbacks.
+metrics = { 'started' : time(),
+            'loopPasses' : 0,
+            'loopSeconds' : Histogram(), # time spent in runSchedule()
+            'buttonEdges' : 0,
+            'callbackSeconds' : Histogram(), # time spent in cbf_button()
+            'edgeSeconds' : Histogram(), # from cbf_button() until the main loop applied the edge
+            'pressSeconds' : Histogram((0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)), # how long buttons were held, by pigpio tick
+            'buttonBounces' : 0, # presses taken as contact bounce
+            'ledWrites' : 0,
+            'ledBytes' : 0,
+            'ledReconnects' : 0,
+            'animationFrames' : 0, # frames composed while an animation ran
+            'logQueued' : 0, # records handed to the log writer thread
+            'logDropped' : 0, # records dropped as the log writer fell logQueueSize behind
+            'cronHits' : 0, # getNextDeadLine() answered from cronCache
+            'cronMisses' : 0
+          }
+
+# --statusHttp, 'snapshot' is rebuilt by the main loop after every pass and replaced whole, so the server
+# thread only ever reads a complete one and does all the formatting itself.
+status = { 'server' : None,
+           'snapshot' : None
+         }
 
 def cbf_button(GPIO, level, tick):
+  ''' runs on pigpio's callback thread, only timestamps the edge and hands it to the main loop '''
+  started = perf_counter()
+  buttonEdges.put((GPIO, level, tick, clock.now(), started))
+  metrics['buttonEdges'] += 1
+  metrics['callbackSeconds'].observe(perf_counter() - started)
+
+def drainButtonEdges():
+  ''' apply every edge queued by cbf_button() in arrival order '''
+  while True:
+    try:
+      item = buttonEdges.get_nowait()
+    except queue.Empty:
+      return
+    applyQueued(item)
+
+def applyQueued(item):
+  ''' an edge queued by cbf_button(), or a reload queued by SIGHUP '''
+  if item == 'reload':
+    reloadConfig(clock.now())
+  else:
+    applyButtonEdge(*item)
+
+def tickDiff(start, end):
+  ''' microseconds from pigpio tick start to end, the 32 bit ticks wrap every 71 minutes '''
+  return (end - start) & 0xFFFFFFFF
+
+def tickSince(mark, tick, currentDate):
+  ''' microseconds from mark, the (tick, currentDate) of an earlier edge, to this edge. a gap the wall clock puts at
+  half a tick wrap or more is measured by the wall clock, as the ticks can no longer tell how many times they wrapped '''
+  since = currentDate - mark[1]
+  if since >= timedelta(microseconds = 1 << 31):
+    return since / timedelta(microseconds = 1)
+  return tickDiff(mark[0], tick)
+
+def pinTiming(GPIO):
+  ''' the button timing of a pin, created on first use '''
+  timing = buttonTiming.get(GPIO)
+  if timing is None:
+    timing = buttonTiming[GPIO] = { 'level' : buttonLevels.get(GPIO, 1), # last level seen, bounces included
+                                    'press' : None, # (tick, currentDate) of the last accepted press
+                                    'release' : None, # (tick, currentDate) of the last accepted release
+                                    'chatter' : False, # a press was taken as a bounce, so is its release
+                                    'blocked' : False, # the current press came within buttonDelay
+                                    'next allowed' : datetime.min }
+  return timing
+
+def applyButtonEdge(GPIO, level, tick, currentDate, queued):
+  ''' record a button change against its tasks, on the main loop which owns the tasks and the LED output.
+  press lengths and gaps are measured on pigpio's tick, a long press undoes a completion and a double press gets past buttonDelay '''
   global tasks
+  metrics['edgeSeconds'].observe(perf_counter() - queued)
+
+  logger.log(logging.DEBUG-2, 'config["Title 0"] = %s', LazyPformat(config['Title 0']))
+  logger.debug('gpio_pin = %s, level = %s, tick = %s, currentDate = %s', GPIO, level, tick, currentDate)
+
+  timing = pinTiming(GPIO)
+  if level not in (0, 1) or level == timing['level']:
+    return # 2 is a watchdog timeout, and a repeated level is no edge
+  timing['level'] = level
+  if level == 0:
+    if timing['release'] is not None and tickSince(timing['release'], tick, currentDate) < args.debounce * 1000:
+      ''' too soon after the release, contact bounce rather than a press '''
+      timing['chatter'] = True
+      metrics['buttonBounces'] += 1
+      return
+    gesture = 'double' if timing['press'] is not None and tickSince(timing['press'], tick, currentDate) < args.doublePress * 1000 else 'press'
+    timing['press'] = (tick, currentDate)
+    timing['blocked'] = currentDate < timing['next allowed'] and gesture != 'double'
+  else:
+    if timing['chatter']:
+      timing['chatter'] = False
+      return
+    held = tickSince(timing['press'], tick, currentDate) if timing['press'] is not None else 0
+    metrics['pressSeconds'].observe(held / 1000000)
+    timing['release'] = (tick, currentDate)
+    gesture = 'long' if held >= args.longPress * 1000 else 'release'
+    logger.debug('gpio_pin %s held for %.3f seconds', GPIO, held / 1000000)
+  buttonLevels[GPIO] = level
+
+  for section in buttonTasks.get(GPIO, ()):
+    ''' if GPIO is a defined task lets record the button change '''
+    if gesture == 'long' and tasks[section].state == 'completed':
+      ''' undo the completion, the task goes back to what its deadlines say '''
+      logger.info('tasks[%s] completion undone by a long press', section)
+      window = (tasks[section].PendingGraceDate, tasks[section].PendingToLateDate)
+      tasks[section].ButtonReleases = [r for r in tasks[section].ButtonReleases if not window[0] < r <= window[1]] or [window[0] - timedelta(seconds=1)]
+      tasks[section].state = None
+      timing['next allowed'] = datetime.min
+      recordHistory('U', section, currentDate)
+      fill_ws281x(colors[tasks[section].currentColor], tasks[section].led_start, tasks[section].led_length, tasks[section].channel)
+      buttonSections.add(section)
+      continue
+
+    if (level == 0) and timing['blocked']:
+      ''' if button was pressed & to early'''
+      buttonAction = 'ButtonPresses'
+      color = colors['purple']
+      logger.debug('currentDate of %s is before next allowed date of %s', LazyStrftime(currentDate), LazyStrftime(timing['next allowed']))
+    elif (level == 0):
+      ''' if button was pressed & after delay, or pressed twice to get past it '''
+      buttonAction = 'ButtonPresses'
+      color = colors['wht']
+    else:
+      ''' otherwise it was released '''
+      buttonAction = 'ButtonReleases'
+      color = colors[tasks[section].currentColor]
+    
+    if not timing['blocked']:
+      ''' update is not blocked by button delay '''
+      logger.log(logging.DEBUG-1, "tasks[%s] button = %s", section, buttonAction)
+      if (tasks[section].PendingGraceDate < currentDate <= tasks[section].PendingToLateDate) or args.lightbutton :
+        ''' Only update if task is in time window '''
+        buttonEvents = getattr(tasks[section], buttonAction)
+        buttonEvents.append(currentDate)
+        del buttonEvents[:-4] # truncate to only recent changes.
+        recordHistory('P' if buttonAction == 'ButtonPresses' else 'R', section, currentDate)
+        if buttonAction == 'ButtonPresses':
+          tasks[section].pressCount += 1
+        else:
+          tasks[section].releaseCount += 1
+        if tasks[section].description:
+          logger.log(logging.DEBUG-1, "tasks[%s].description = %s", section, tasks[section].description)
+        logger.log(logging.DEBUG-1, "tasks[%s].%s = %s", section, buttonAction, buttonEvents[-1])
+        logger.log(logging.DEBUG-4, "tasks[%s].%s = %s", section, buttonAction, LazyPformat(buttonEvents))
+
+    if ((tasks[section].PendingGraceDate < currentDate <= tasks[section].PendingToLateDate) or (buttonAction == 'ButtonReleases') or args.lightbutton ) :
+      ''' Only update if task is in time window or if restoring color to avoid timing hole of being left on.'''
+      fill_ws281x(color, tasks[section].led_start, tasks[section].led_length, tasks[section].channel)
+      if buttonAction == 'ButtonReleases':
+        animateTask(section)
+      else:
+        animations.pop(section, None) # the pressed color shows as it is
+
+    ''' re-evaluate this task now rather than at its next deadline '''
+    buttonSections.add(section)
+# end of applyButtonEdge():
+
+def parseDuration(value):
+  ''' INI durations are either HH:MM:SS or a number of seconds '''
+  value = value.strip()
+  if ':' in value:
+    x = strptime(value,'%H:%M:%S')
+    return timedelta(hours=x.tm_hour,minutes=x.tm_min,seconds=x.tm_sec)
+  return timedelta(seconds = int(value))
+
+def isTaskSection(options):
+  return options.get('gpio_pin', '').strip().isdigit() and ('deadline' in options)
+
+def sectionTitle(section, options):
+  ''' the [Title N] a section belongs to, from its "title = N" option, Title 0 by default '''
+  title = options.get('title', '0').strip()
+  if not title.startswith('Title '):
+    title = 'Title ' + title
+  if title not in titles:
+    raise ValueError('[%s] title = %s, there is no [%s]' % (section, options.get('title'), title))
+  return title
+
+def compileTask(section, options):
+  ''' build a Task from its merged INI/IO section, parsing everything the main loop needs once '''
+  title = sectionTitle(section, options)
+  if ';' in options['deadline']:
+    deadlineList = [x.strip() for x in options['deadline'].split(';')]
+    logger.log(logging.DEBUG-2, "%s's deadlineList = %s", section, LazyPformat(deadlineList))
+    grace, deadline, persist = deadlineList
+  else:
+    grace, deadline, persist = options.get('grace', '0'), options['deadline'].strip(), options.get('persist', '0')
 
-  logger.log(logging.DEBUG-2, 'config["Title 0"] = ' + pp.pformat(config['Title 0']))
+  ''' set glitch filter level either from last GPIO or Title or argument '''
+  if 'glitch' in options: # if found in section
+    glitch = int(options['glitch']) # then go with it.
+  elif 'glitch' in config[title]: # if found in its Title
+    glitch = int(config[title]['glitch'])
+  else:
+    glitch = int(args.glitch) # default
+
+  return Task(section = section,
+              description = options.get('description', ''),
+              title = title,
+              channel = config[title]['channel'],
+              gpio_pin = int(options['gpio_pin']),
+              led_start = int(options['led_start']),
+              led_length = int(options['led_length']),
+              glitch = glitch,
+              deadline = deadline,
+              grace = parseDuration(grace),
+              persist = parseDuration(persist),
+              crontab = CronTab(deadline))
+# end of compileTask():
+
+def weeklySchedule(task):
+  ''' True when the task's schedule depends only on the weekday and time of day, so it repeats every 7 days '''
+  matchers = task.crontab.matchers
+  return (matchers.day.any and matchers.month.any and matchers.year.any
+          and not any(entry.startswith('l') for entry in matchers.weekday.split)) # L5, the last Friday of the month
+
+def cronNext(task, after):
+  ''' the first due date of the task's schedule after after. CronTab.next() is slow, so a weekly schedule has
+  one week of due dates computed once and repeated '''
+  if task.deadline not in cronWeeks:
+    week, PendingDueDate = [], cronWeekStart
+    if weeklySchedule(task):
+      while True:
+        PendingDueDate += timedelta(seconds = task.crontab.next(PendingDueDate, default_utc = False)) # Crontab.next() returns remaining seconds.
+        if PendingDueDate > cronWeekStart + timedelta(days = 7) or len(week) > cronWeekMost:
+          break
+        week.append(PendingDueDate - cronWeekStart)
+    cronWeeks[task.deadline] = week if 0 < len(week) <= cronWeekMost else None
+    while len(cronWeeks) > cronWeeksSize:
+      del cronWeeks[next(iter(cronWeeks))]
+  week = cronWeeks[task.deadline]
+  if week is None:
+    return after + timedelta(seconds = task.crontab.next(after, default_utc = False))
+  weekStart = cronWeekStart + timedelta(days = 7) * ((after - cronWeekStart) // timedelta(days = 7))
+  index = bisect.bisect_right(week, after - weekStart)
+  return weekStart + week[index] if index < len(week) else weekStart + timedelta(days = 7) + week[0]
+
+def getOccurrences(currentDate, task):
+  ''' the cached occurrences of the task's schedule, and the index of the first one due after currentDate '''
+  key = (task.deadline, task.grace, task.persist)
+  entry = cronCache.get(key)
+  if entry is not None:
+    start, occurrences = entry
+    if start <= currentDate < occurrences[-1][0]:
+      metrics['cronHits'] += 1
+      cronCache.move_to_end(key)
+      return occurrences, bisect.bisect_right(occurrences, (currentDate, datetime.max, datetime.max)) # past every occurrence due at currentDate, bisect's key= needs Python 3.10
+
+  metrics['cronMisses'] += 1
+  if entry is not None and start <= currentDate < occurrences[-1][0] + (occurrences[-1][0] - start):
+    ''' moving forward just past the cached occurrences, carry on from the last one with twice as many '''
+    PendingDueDate, count = occurrences[-1][0], min(2 * len(occurrences), cronCacheOccurrences)
+  else:
+    ''' a new schedule or a jump in time, CronTab.next() is slow so only compute what is asked for '''
+    PendingDueDate, count = currentDate, 1
+  occurrences = []
+  while len(occurrences) < count:
+    PendingDueDate = cronNext(task, PendingDueDate)
+    if PendingDueDate > currentDate:
+      occurrences.append((PendingDueDate,
+                          PendingDueDate - task.grace, # Time to Start Yellow LEDs
+                          PendingDueDate + task.persist)) # delay until turn off LEDs
+  cronCache[key] = (currentDate, occurrences)
+  cronCache.move_to_end(key)
+  while len(cronCache) > cronCacheSize:
+    cronCache.popitem(last = False)
+  return occurrences, 0
+# end of getOccurrences():
+
+def nextDeadLines(currentDate, task):
+  ''' yield (PendingDueDate, PendingGraceDate, PendingToLateDate) of every deadline of the task due after currentDate, in order, through cronCache '''
+  occurrences, index = getOccurrences(currentDate, task)
+  while True:
+    yield from occurrences[index:]
+    occurrences, index = getOccurrences(occurrences[-1][0], task)
+
+def getNextDeadLine(currentDate, task):
+  occurrences, index = getOccurrences(currentDate, task)
+  PendingDueDate, PendingGraceDate, PendingToLateDate = occurrences[index]
+  logger.log(logging.DEBUG-2, 'New PendingDueDate = %s', LazyStrftime(PendingDueDate))
+  logger.log(logging.DEBUG-2, 'New PendingGraceDate = %s', LazyStrftime(PendingGraceDate))
+  logger.log(logging.DEBUG-2, 'New PendingToLateDate = %s', LazyStrftime(PendingToLateDate))
 
-  currentDate = datetime.now()
-  logger.debug('gpio_pin = ' + str(GPIO ) + ', level = ' + str(level ) + ', tick "' + str(tick) + ', currentDate = ' + str(currentDate))
-  for section in tasks.keys():
-    if int(tasks[section]['gpio_pin']) == GPIO:
-      ''' if GPIO is a defined task lets record the button change '''
-      if (level == 0) and (currentDate < config['Title 0']['next allowed']):
-        ''' if button was pressed & to early'''
-        buttonAction = 'ButtonPresses'
-        color = colors['purple']
-        logger.debug('currentDate of ' + currentDate.strftime('%Y-%m-%d %a %H:%M:%S') + ' is before next allowed date of ' + config['Title 0']['next allowed'].strftime('%Y-%m-%d %a %H:%M:%S'))
-      elif (level == 0):
-        ''' if button was pressed & after delay '''
-        buttonAction = 'ButtonPresses'
-        color = colors['wht']
+  return PendingDueDate, PendingGraceDate, PendingToLateDate
+
+def deadlineAt(when, task):
+  ''' (PendingDueDate, PendingGraceDate, PendingToLateDate) of the task's first deadline whose window has not closed by when '''
+  return getNextDeadLine(when - task.persist - timedelta(microseconds = 1), task)
+
+def boardAt(when):
+  ''' what the schedule alone shows at when, {section : state} and {title : state}, ignoring button presses '''
+  states = {}
+  for section, task in tasks.items():
+    PendingDueDate, PendingGraceDate, PendingToLateDate = deadlineAt(when, task)
+    if when <= PendingGraceDate:
+      states[section] = 'beforeGrace'
+    elif when <= PendingDueDate:
+      states[section] = 'pending'
+    else:
+      states[section] = 'late'
+  return states, {title : ('incomplete' if any(states[section] != 'beforeGrace' for section in sections) else 'off')
+                   for title, sections in titles.items()}
+# end of boardAt():
+
+def loadTasks(currentDate, prior = None, unchanged = (), compiled = None):
+  ''' compile the titles and task sections of config, determine each strip's maximum LED position and index the buttons, returns {gpio_pin : glitch}
+  a reload passes the prior tasks, the unchanged sections are reused as they are and a recompiled task keeps its state while its schedule stays the same
+  compiled are tasks from --configCache, used instead of compiling their sections again '''
+  global tasks
+
+  strips.clear()
+  titles.clear()
+  buttonPins = {}
+  tasks = {}
+  buttonTasks.clear()
+  for section in config.keys():
+    if section.startswith('Title '):
+      titles[section] = []
+      for key in ('led_start', 'led_length'):
+        config[section][key] = int(config[section][key])
+      config[section]['channel'] = int(config[section].get('channel', ws281x['PWMchannel']))
+      strip = strips.setdefault(config[section]['channel'], {'NeopixelPin' : int(config[section].get('neopixel_pin', ws281x['NeopixelPin'])), 'LedCount' : 0})
+      if int(config[section].get('neopixel_pin', strip['NeopixelPin'])) != strip['NeopixelPin']:
+        logger.warning('[%s] neopixel_pin = %s ignored, channel %d is already on pin %d', section, config[section]['neopixel_pin'], config[section]['channel'], strip['NeopixelPin'])
+
+  for section in config.keys():
+    if 'led_start' in config[section]:
+      maxTemp = int(config[section]['led_start']) + int(config[section]['led_length'])
+      title = section if section in titles else sectionTitle(section, config[section])
+      strip = strips[config[title]['channel']]
+      if maxTemp > strip['LedCount']:
+        strip['LedCount'] = maxTemp
+
+
+    logger.debug('section = %s, led_start = %s, gpio_pin = %s, led_length = %s, deadline = "%s"', section,
+                 config[section].get('led_start'), config[section].get('gpio_pin'), config[section].get('led_length'), config[section].get('deadline'))
+
+    if isTaskSection(config[section]):
+      previous = prior.get(section) if prior else None
+      if section in unchanged:
+        tasks[section] = previous
       else:
-        ''' otherwise it was released '''
-        buttonAction = 'ButtonReleases'
-        color = colors[tasks[section]['currentColor']]
-      
-      if currentDate >= config['Title 0']['next allowed']:
-        ''' update is not blocked by button delay '''
-        logger.log(logging.DEBUG-1, "tasks[" + section + "] button = " + buttonAction)
-        if (tasks[section]['PendingGraceDate'] < currentDate <= tasks[section]['PendingToLateDate']) or args.lightbutton :
-          ''' Only update if task is in time window '''
-          tasks[section][buttonAction].append(currentDate)
-          tasks[section][buttonAction] = tasks[section][buttonAction][-4:] # truncate to only recent changes.
-          if tasks[section].get('description'):
-            logger.log(logging.DEBUG-1, "tasks[" + section + "]['description'] = " + tasks[section]['description'] )
-          logger.log(logging.DEBUG-1, "tasks[" + section + "][" + buttonAction + "] = " + str(tasks[section][buttonAction][-1]) )
-          logger.log(logging.DEBUG-4, "tasks[" + section + "][" + buttonAction + "] = " + pp.pformat(tasks[section][buttonAction]) )
-
-      if ((tasks[section]['PendingGraceDate'] < currentDate <= tasks[section]['PendingToLateDate']) or (buttonAction == 'ButtonReleases') or args.lightbutton ) :
-        ''' Only update if task is in time window or if restoring color to avoid timing hole of being left on.'''
-        write_ws281x('fill ' + str(ws281x['PWMchannel']) + ',' + \
-                     color  + ',' + \
-                     str(tasks[section]['led_start']) + ',' + \
-                     str(int(tasks[section]['led_length'])) + \
-                     '\nrender\n')
-
-def getNextDeadLine(currentDate, section):
-  PendingDueDate = currentDate + timedelta(seconds = section['crontab'].next(currentDate.timestamp())) # Crontab.next() returns remaining seconds.
-  logger.log(logging.DEBUG-2, 'New PendingDueDate = ' + PendingDueDate.strftime('%Y-%m-%d %a %H:%M:%S'))
-
-  if ':' in section['grace']:
-    x = strptime(section['grace'],'%H:%M:%S')
-    grace_sec = timedelta(hours=x.tm_hour,minutes=x.tm_min,seconds=x.tm_sec).total_seconds()
+        tasks[section] = compiled.pop(section) if compiled and section in compiled else compileTask(section, config[section])
+        if previous is not None and (previous.deadline, previous.grace, previous.persist) == (tasks[section].deadline, tasks[section].grace, tasks[section].persist):
+          for name in taskState:
+            setattr(tasks[section], name, getattr(previous, name))
+        else:
+          tasks[section].PendingDueDate, tasks[section].PendingGraceDate, tasks[section].PendingToLateDate = getNextDeadLine(currentDate, tasks[section])
+          tasks[section].ButtonReleases = [tasks[section].PendingGraceDate - timedelta(seconds=1)]
+          tasks[section].ButtonPresses = [tasks[section].PendingGraceDate - timedelta(seconds=1)]
+      titles[tasks[section].title].append(section)
+      buttonPins[tasks[section].gpio_pin] = tasks[section].glitch
+      buttonTasks.setdefault(tasks[section].gpio_pin, []).append(section)
+
+  return buttonPins
+# end of loadTasks():
+
+def resetTitles(currentDate, names = None):
+  ''' the titles, or just those named, start dark '''
+  for title in titles if names is None else names:
+    config[title]['currentColor'] = 'off'
+    config[title]['state'] = 'starting'
+
+def reloadConfig(currentDate):
+  ''' re-read the INI and IO files and apply only the sections that changed, the other tasks keep their state and LEDs '''
+  global config, configRaw, configStamp, tasks, sunLocation
+
+  configStamp = configMtimes()
+  try:
+    newRaw = readConfig()
+  except configparser.Error as e:
+    logger.error('config not reloaded, %s', e)
+    return
+  changed = sorted(section for section in newRaw.keys() | configRaw.keys() if newRaw.get(section) != configRaw.get(section))
+  if not changed:
+    logger.info('config reloaded, nothing changed')
+    return
+
+  priorConfig, priorTasks = config, tasks
+  priorStrips, priorTitles, priorButtonTasks = copy.deepcopy(strips), copy.deepcopy(titles), copy.deepcopy(buttonTasks)
+  unchanged = {section for section, task in priorTasks.items() if section not in changed and task.title not in changed}
+  try:
+    config = copy.deepcopy(newRaw)
+    configDefaults(config) # a half saved INI may have no [Title 0]
+    for title in config.keys() & priorConfig.keys():
+      if title.startswith('Title '):
+        config[title].update({key : priorConfig[title][key] for key in titleState if key in priorConfig[title]})
+    buttonPins = loadTasks(currentDate, priorTasks, unchanged)
+  except (KeyError, ValueError) as e:
+    ''' keep running on what was loaded before '''
+    config, tasks = priorConfig, priorTasks
+    for current, prior in ((strips, priorStrips), (titles, priorTitles), (buttonTasks, priorButtonTasks)):
+      current.clear()
+      current.update(prior)
+    logger.error('config not reloaded, %s', e)
+    return
+  configRaw = newRaw
+  resetTitles(currentDate, [title for title in titles if 'state' not in config[title]])
+
+  ''' blank where the changed and removed sections were, repaintBoard() paints what is left back in place '''
+  for section in changed:
+    if section in priorTasks:
+      fill_ws281x(colors['off'], priorTasks[section].led_start, priorTasks[section].led_length, priorTasks[section].channel)
+    elif section in priorTitles:
+      fill_ws281x(colors['off'], priorConfig[section]['led_start'], priorConfig[section]['led_length'], priorConfig[section]['channel'])
+  for section in changed:
+    animations.pop(section, None)
+  if strips != priorStrips:
+    ''' a strip grew, shrank or moved, ws2812svr has to set the strips up again '''
+    logger.info('strips changed, setting up ws2812svr again')
+    postFrames.clear()
+    animations.clear()
+    setup_ws281x()
+  repaintBoard()
+  for section in tasks.keys() - unchanged:
+    animateTask(section)
+  if 'Title 0' in changed:
+    if any(config['Title 0'].get(key) != priorConfig['Title 0'].get(key) for key in ('latitude', 'longitude', 'timezone')):
+      ''' the board moved, the dawn and sunset carried over are for the old place '''
+      sunLocation = None
+      sunTimes.clear()
+      config['Title 0']['dawn'], config['Title 0']['sunset'] = getSunUPandSunDown(currentDate)
+      logger.info('location changed, dawn %s and sunset %s', LazyStrftime(config['Title 0']['dawn']), LazyStrftime(config['Title 0']['sunset']))
+    updateBrightness(currentDate, force = True)
+    armSchedule('Title 0', min(config['Title 0']['dawn'], config['Title 0']['sunset']) + timedelta(microseconds = 1))
+
+  for buttonPin in armButtons(buttonPins):
+    buttonLevels[buttonPin] = pi.read(buttonPin)
+  for section in priorTasks.keys() - tasks.keys():
+    scheduled.pop(section, None) # its heap entries are now stale
+  for section in tasks.keys() - unchanged:
+    armSchedule(section, currentDate)
+  for level, message in configProblems():
+    logger.log(level, '%s', message)
+  saveConfigCache()
+  logger.info('config reloaded, changed sections: %s', ', '.join(changed))
+# end of reloadConfig():
+
+def armButtons(buttonPins):
+  ''' set up the GPIO of new button pins, refilter those whose glitch changed and release the pins no longer used, returns the new pins '''
+  for buttonPin in [pin for pin in buttonCallbacks if pin not in buttonPins]:
+    buttonCallbacks.pop(buttonPin)[0].cancel()
+    pi.set_glitch_filter(buttonPin, 0)
+    buttonLevels.pop(buttonPin, None)
+    buttonTiming.pop(buttonPin, None)
+  armed = []
+  for buttonPin, glitch in buttonPins.items():
+    if buttonPin not in buttonCallbacks:
+      ''' config each used GPIO pins '''
+      pi.set_mode(buttonPin, pigpio.INPUT)
+      pi.set_pull_up_down(buttonPin, pigpio.PUD_UP)
+      pi.set_glitch_filter(buttonPin, glitch)
+      buttonCallbacks[buttonPin] = (pi.callback(buttonPin, pigpio.EITHER_EDGE, cbf_button), glitch)
+      armed.append(buttonPin)
+    elif buttonCallbacks[buttonPin][1] != glitch:
+      pi.set_glitch_filter(buttonPin, glitch)
+      buttonCallbacks[buttonPin] = (buttonCallbacks[buttonPin][0], glitch)
+  return armed
+
+def configProblems():
+  ''' the loaded config's likely mistakes, a list of (logging level, message) '''
+  problems = []
+  ranges = {} # channel -> [(led_start, end, section)]
+  for title in titles:
+    ranges.setdefault(config[title]['channel'], []).append((config[title]['led_start'], config[title]['led_start'] + config[title]['led_length'], title))
+  for section, task in tasks.items():
+    ranges.setdefault(task.channel, []).append((task.led_start, task.led_start + task.led_length, section))
+  for channel, channelRanges in ranges.items():
+    reach = None # (end, section) reaching furthest so far
+    for start, end, section in sorted(channelRanges):
+      if reach is not None and start < reach[0]:
+        problems.append((logging.WARNING, 'LEDs of [%s] overlap [%s] on channel %d from %d' % (section, reach[1], channel, start)))
+      if reach is None or end > reach[0]:
+        reach = (end, section)
+
+  for buttonPin, sections in buttonTasks.items():
+    if len(sections) > 1:
+      problems.append((logging.INFO, 'gpio_pin %d is shared by [%s]' % (buttonPin, '], ['.join(sections))))
+
+  iniParse, ioParse = configparser.ConfigParser(), configparser.ConfigParser()
+  iniParse.read(args.config)
+  ioParse.read(args.io)
+  for section in ioParse.sections():
+    if not iniParse.has_section(section):
+      problems.append((logging.WARNING, '[%s] is only in %s' % (section, args.io)))
+  for section, options in config.items():
+    if section not in tasks and section not in titles and ('gpio_pin' in options or 'deadline' in options):
+      problems.append((logging.WARNING, '[%s] is not a task, it needs both gpio_pin and deadline' % section))
+  return problems
+# end of configProblems():
+
+def checkConfig(currentDate):
+  ''' --checkConfig, compile the config as a start up would and report it without touching the hardware, returns the exit status '''
+  try:
+    loadTasks(currentDate)
+  except (KeyError, ValueError) as e:
+    print('error: %s does not compile, %s' % (args.config, e))
+    return 1
+  print('%s and %s: %d titles, %d tasks, %d buttons' % (args.config, args.io, len(titles), len(tasks), len(buttonTasks)))
+  for channel, strip in strips.items():
+    print('channel %d on pin %d: %d LEDs' % (channel, strip['NeopixelPin'], strip['LedCount']))
+  problems = configProblems()
+  for level, message in problems:
+    print('%s: %s' % ('warning' if level >= logging.WARNING else 'note', message))
+  return 1 if any(level >= logging.WARNING for level, message in problems) else 0
+
+previewColors = {'off' : 'off', 'pending' : 'ylw', 'late' : 'red', 'incomplete' : 'off'}
+
+def taskTimeline(task, start, end):
+  ''' [(state, from, to)] of the task from start to end as its deadlines alone drive it, without button presses.
+  each state holds after from up to and including to, one step per deadline rather than per second '''
+  timeline = []
+  occurrences = nextDeadLines(start - task.persist, task)
+  PendingDueDate, PendingGraceDate, PendingToLateDate = next(occurrences)
+  cursor = start
+  while cursor < end:
+    while PendingToLateDate <= cursor:
+      ''' the first deadline whose window has not closed by cursor '''
+      PendingDueDate, PendingGraceDate, PendingToLateDate = next(occurrences)
+    if cursor < PendingGraceDate:
+      state, until = 'off', PendingGraceDate
+    elif cursor < PendingDueDate:
+      state, until = 'pending', PendingDueDate
+    else:
+      state, until = 'late', PendingToLateDate
+    until = min(until, end)
+    if timeline and timeline[-1][0] == state:
+      timeline[-1] = (state, timeline[-1][1], until)
+    else:
+      timeline.append((state, cursor, until))
+    cursor = until
+  return timeline
+
+def titleTimeline(timelines, start, end):
+  ''' [(state, from, to)] of a title from the timelines of its tasks, incomplete while any of them is pending or late '''
+  changes = []
+  for timeline in timelines:
+    for state, begin, until in timeline:
+      if state != 'off':
+        changes.append((begin, 1))
+        changes.append((until, -1))
+  changes.append((end, 0))
+  changes.sort()
+  timeline = []
+  cursor, active = start, 0
+  for when, change in changes:
+    if when > cursor:
+      state = 'incomplete' if active else 'off'
+      if timeline and timeline[-1][0] == state:
+        timeline[-1] = (state, timeline[-1][1], when)
+      else:
+        timeline.append((state, cursor, when))
+      cursor = when
+    active += change
+  return timeline
+
+def previewTimeline(start, end = None):
+  ''' --preview, write the timeline of every task and title from start to end in --previewFormat, or the board at start
+  when there is no end, returns the exit status '''
+  try:
+    loadTasks(start, compiled = compiledConfig['tasks'] if compiledConfig else None)
+  except (KeyError, ValueError) as e:
+    print('error: %s does not compile, %s' % (args.config, e))
+    return 1
+  timelines = {}
+  if end is None:
+    states, titleStates = boardAt(start)
+    for section, state in list(states.items()) + list(titleStates.items()):
+      timelines[section] = [('off' if state == 'beforeGrace' else state, start, start)]
   else:
-    grace_sec = int(section['grace'])
-  PendingGraceDate = PendingDueDate - timedelta(seconds = grace_sec) # Time to Start Yellow LEDs
-  logger.log(logging.DEBUG-2, 'New PendingGraceDate = ' + PendingGraceDate.strftime('%Y-%m-%d %a %H:%M:%S'))
-  
-  if ':' in section['persist']:
-    x = strptime(section['persist'],'%H:%M:%S')
-    persist_sec = timedelta(hours=x.tm_hour,minutes=x.tm_min,seconds=x.tm_sec).total_seconds()
+    schedules = {} # tasks on the same schedule have the same timeline
+    for section, task in tasks.items():
+      key = (task.deadline, task.grace, task.persist)
+      if key not in schedules:
+        schedules[key] = taskTimeline(task, start, end)
+      timelines[section] = schedules[key]
+    for title, sections in titles.items():
+      timelines[title] = titleTimeline([timelines[section] for section in sections], start, end)
+
+  rows = ((section, section if section in titles else tasks[section].title, state, previewColors[state], begin, until)
+          for section, timeline in timelines.items() for state, begin, until in timeline)
+  if args.previewFormat == 'json':
+    json.dump({section : [{'state' : state, 'color' : previewColors[state], 'from' : begin.isoformat(), 'to' : until.isoformat()} for state, begin, until in timeline]
+               for section, timeline in timelines.items()}, sys.stdout, indent = 1)
+    sys.stdout.write('\n')
+  elif args.previewFormat == 'csv':
+    import csv
+    writer = csv.writer(sys.stdout)
+    writer.writerow(('section', 'title', 'state', 'color', 'from', 'to'))
+    for section, title, state, color, begin, until in rows:
+      writer.writerow((section, title, state, color, begin.isoformat(' '), until.isoformat(' ')))
   else:
-    persist_sec = int(section['persist'])
-  PendingToLateDate = PendingDueDate + timedelta(seconds = persist_sec) # delay until turn off LEDs
-  logger.log(logging.DEBUG-2, 'New PendingGraceDate = ' + PendingGraceDate.strftime('%Y-%m-%d %a %H:%M:%S'))
+    width = max(len(section) for section in timelines)
+    for section, title, state, color, begin, until in rows:
+      sys.stdout.write('%-*s  %-7s  %-10s  %-3s  %s  %s\n' % (width, section, title, state, color, begin.strftime('%Y-%m-%d %a %H:%M:%S'), until.strftime('%Y-%m-%d %a %H:%M:%S')))
+  return 0
+# end of previewTimeline():
 
-  return PendingDueDate, PendingGraceDate, PendingToLateDate
+#### --report, chore statistics from the logs and the history ####
+
+reportStateVersion = 1
+# updateTask()'s and applyButtonEdge()'s debug lines, asctime in the log file or the virtual time with --simulate
+logTaskLine = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)(?:,(\d{3}))? .*?\((?:updateTask|applyButtonEdge)\) tasks\[(.+?)\] (?:Changing state from \S+ to (\S+)|completion (undone) by a long press)\s*$')
+
+def logFileName():
+  return '/var/log/{0}/{0}.log'.format(fn)
+
+def rotatedFiles(base):
+  ''' the files of a rotated log or an archived history, oldest first: base.N[.gz] ... base.1[.gz], base.gz, base '''
+  directory, name = os.path.split(base)
+  numbered = []
+  try:
+    for entry in os.listdir(directory or '.'):
+      match = re.fullmatch(re.escape(name) + r'\.(\d+)(\.gz)?', entry)
+      if match:
+        numbered.append((-int(match.group(1)), match.group(2) is None, os.path.join(directory, entry)))
+  except OSError:
+    return []
+  files = [path for number, plain, path in sorted(numbered)]
+  return files + [path for path in (base + '.gz', base) if os.path.exists(path)]
+
+def readLines(path, positions, seen):
+  ''' yield the lines of path added since the offset positions has for it, moving that offset along.
+  files are known by inode so a rotated log keeps its offset, a gzipped one by the compressed size as gzip members are only ever appended '''
+  try:
+    with open(path, 'rb') as raw:
+      stat = os.fstat(raw.fileno())
+      key = '%d:%d' % (stat.st_dev, stat.st_ino)
+      seen.add(key)
+      position = positions.setdefault(key, {'path' : path, 'offset' : 0})
+      position['path'] = path
+      if stat.st_size < position['offset']:
+        position['offset'] = 0 # truncated, or a new file on a reused inode
+      raw.seek(position['offset'])
+      if path.endswith('.gz'):
+        import gzip
+        with gzip.GzipFile(fileobj = raw) as gz:
+          for line in gz:
+            yield line.decode('utf-8', 'replace')
+        position['offset'] = raw.tell()
+      else:
+        for line in raw:
+          if not line.endswith(b'\n'):
+            break # still being written, read it next time
+          position['offset'] += len(line)
+          yield line.decode('utf-8', 'replace')
+  except (OSError, EOFError) as e: # EOFError is a gzip member still being written
+    logger.warning('unable to read %s: %s', path, e)
+
+def logEvents(lines):
+  ''' yield (when, section, state, None) of the state changes and undone completions in log lines, the deadline is not logged '''
+  for line in lines:
+    match = logTaskLine.match(line)
+    if match:
+      stamp, millis, section, state, undone = match.groups()
+      yield datetime.strptime(stamp, '%Y-%m-%d %H:%M:%S') + timedelta(milliseconds = int(millis or 0)), section, undone or state, None
+
+def historyEvents(lines):
+  ''' yield (when, section, state, PendingDueDate) of the state changes, snapshots and undone completions in history lines '''
+  for when, kind, section, values in parseHistory(lines):
+    try:
+      if kind == 'S':
+        yield when, section, values[0], datetime.fromtimestamp(int(values[1]))
+      elif kind == 'C':
+        ''' a snapshot restates the task after compaction, a completion at its last release '''
+        yield (datetime.fromtimestamp(float(values[2])) if values[0] == 'completed' else when), section, values[0], datetime.fromtimestamp(int(values[1]))
+      elif kind == 'U':
+        yield when, section, 'undone', None
+    except (IndexError, ValueError):
+      logger.warning('skipping malformed history line of %s', section)
+
+def newReportStats():
+  return {'onTime' : 0, 'late' : 0, 'missed' : 0, 'streak' : 0, 'best' : 0, 'minutes' : {}} # minutes from PendingDueDate to completion : count
+
+def closeWindow(report, section, window):
+  ''' count a deadline window that is over, on time or late when it was completed, missed when it went by pending or late '''
+  due, completed, active = window
+  if completed is not None:
+    outcome = 'onTime' if completed <= due else 'late'
+  elif active:
+    outcome = 'missed'
+  else:
+    return # nobody was asked to do it, the board was off or it never got to pending
+  statistics = [report['sections'].setdefault(section, newReportStats())]
+  if section in tasks:
+    statistics.append(report['titles'].setdefault(tasks[section].title, newReportStats()))
+  for stats in statistics:
+    stats[outcome] += 1
+    if completed is not None:
+      minute = str(round((completed - due) / 60))
+      stats['minutes'][minute] = stats['minutes'].get(minute, 0) + 1
+    stats['streak'] = stats['streak'] + 1 if outcome == 'onTime' else 0
+    stats['best'] = max(stats['best'], stats['streak'])
+
+def reportEvent(report, when, section, state, PendingDueDate):
+  ''' fold one event into the open deadline window of its section, closing the prior window when a later deadline shows up '''
+  window = report['open'].get(section)
+  if state == 'undone':
+    if window is not None:
+      window[1] = None
+    return
+  if PendingDueDate is None:
+    if section not in tasks:
+      return # a log line of a task no longer in the INI, its deadlines are unknown
+    PendingDueDate = deadlineAt(when, tasks[section])[0]
+  due = PendingDueDate.timestamp()
+  if window is not None and due < window[0]:
+    return # a snapshot of a window already counted
+  if window is None or due > window[0]:
+    if window is not None:
+      closeWindow(report, section, window)
+    window = report['open'][section] = [due, None, False]
+  if state == 'completed':
+    window[1] = when.timestamp() if window[1] is None else min(window[1], when.timestamp())
+  elif state in ('pending', 'late'):
+    window[2] = True
+
+def medianMinutes(minutes):
+  ''' the median of a {minutes : count} histogram, None when empty '''
+  counts = sorted((int(minute), count) for minute, count in minutes.items())
+  total, seen = sum(count for minute, count in counts), 0
+  for minute, count in counts:
+    seen += count
+    if 2 * seen >= total:
+      return minute
+  return None
+
+def reportHistory(currentDate):
+  ''' --report, count on time, late and missed chores per task and title from the logs and the history, returns the exit status.
+  the files are streamed a line at a time and merged by time, --reportState keeps the counts and the offsets so a re-run reads only what was added '''
+  try:
+    loadTasks(currentDate, compiled = compiledConfig['tasks'] if compiledConfig else None)
+  except (KeyError, ValueError) as e:
+    print('error: %s does not compile, %s' % (args.config, e))
+    return 1
+  report = {'version' : reportStateVersion, 'files' : {}, 'through' : None, 'open' : {}, 'sections' : {}, 'titles' : {}}
+  if args.reportState:
+    try:
+      with open(args.reportState) as stateFile:
+        saved = json.load(stateFile)
+      if saved.get('version') == reportStateVersion:
+        report = saved
+    except FileNotFoundError:
+      pass
+    except (OSError, ValueError) as e:
+      logger.warning('report state %s not read, starting over: %s', args.reportState, e)
+
+  seen = set()
+  logs = [path for base in (args.report or [logFileName()]) for path in rotatedFiles(base)]
+  histories = rotatedFiles(args.history) if args.history else []
+  sources = [logEvents(line for path in logs for line in readLines(path, report['files'], seen)),
+             historyEvents(line for path in histories for line in readLines(path, report['files'], seen))]
+  through = report['through']
+  for event in heapq.merge(*sources, key = lambda event: event[0]):
+    stamp = event[0].timestamp()
+    if report['through'] is None or stamp > report['through']:
+      ''' past where the last report got to, a rotated or compacted file is read again from its start '''
+      reportEvent(report, *event)
+      through = stamp if through is None else max(through, stamp)
+  report['through'] = through
+  for section, window in list(report['open'].items()):
+    ''' windows over by now can not change any more '''
+    if window[0] + (tasks[section].persist.total_seconds() if section in tasks else 0) < currentDate.timestamp():
+      closeWindow(report, section, window)
+      del report['open'][section]
+  report['files'] = {key : position for key, position in report['files'].items() if key in seen}
+
+  if args.reportState:
+    try:
+      with open(args.reportState + '.tmp', 'w') as stateFile:
+        json.dump(report, stateFile)
+      os.replace(args.reportState + '.tmp', args.reportState)
+    except OSError as e:
+      logger.warning('report state not written: %s', e)
+
+  rows = [(section, stats) for section, stats in report['titles'].items()]
+  rows += [(section, report['sections'][section]) for section in tasks if section in report['sections']]
+  rows += sorted((section, stats) for section, stats in report['sections'].items() if section not in tasks)
+  if args.reportFormat == 'json':
+    json.dump({section : dict(onTime = stats['onTime'], late = stats['late'], missed = stats['missed'], medianMinutes = medianMinutes(stats['minutes']),
+                              streak = stats['streak'], best = stats['best'], title = section in report['titles'])
+               for section, stats in rows}, sys.stdout, indent = 1)
+    sys.stdout.write('\n')
+  else:
+    width = max([len(section) for section, stats in rows] + [7])
+    sys.stdout.write('%-*s  %7s  %4s  %6s  %6s  %6s  %4s\n' % (width, 'section', 'on time', 'late', 'missed', 'median', 'streak', 'best'))
+    for section, stats in rows:
+      median = medianMinutes(stats['minutes'])
+      sys.stdout.write('%-*s  %7d  %4d  %6d  %6s  %6d  %4d\n' % (width, section, stats['onTime'], stats['late'], stats['missed'],
+                       '-' if median is None else '%+dm' % median, stats['streak'], stats['best']))
+  return 0
+# end of reportHistory():
 
 def main():
   global ws281x
   global tasks
+  global pi
+  global pigpio
+  global clock
 
   ParseArgs()
+  if args.simulate:
+    clock = VirtualClock(args.simulateStart, args.simulateStart + timedelta(days = args.simulateDays))
+    pigpio = SimulatedPigpio
+  else:
+    clock = RealClock()
+    if not (args.checkConfig or args.preview or args.report is not None):
+      import pigpio
   setupLogging()
-
-  # initialize CTRL-C Exit handler
+  if args.checkConfig:
+    sys.exit(checkConfig(clock.now()))
+  if args.preview:
+    sys.exit(previewTimeline(*args.preview))
+  if args.report is not None:
+    sys.exit(reportHistory(clock.now()))
+
+  # initialize CTRL-C and systemd stop Exit handler
   signal.signal(signal.SIGINT, signal_handler)
+  signal.signal(signal.SIGTERM, signal_handler)
 
 
-  # and determine maximum LED position
-  ws281x['LedCount'] = 0
-  buttonPins = {}
-  tasks = {}
-  
-  currentDate = datetime.now()
+  currentDate = clock.now()
 
   ''' Initially determine and adjust for current Day or Night Time Mode of LED brightness '''
   config['Title 0']['dawn'], config['Title 0']['sunset'] = getSunUPandSunDown()
@@ -142,84 +1042,47 @@ def main():
     ''' Night Mode '''
     logger.info('start the LEDs dimmed for night time')
     ws281x['Brightness'] = config['Title 0']['nightbrightness']
+  ''' the brightness goes out with the setup of the strips '''
+
+  currentDate = clock.now()
+  if compiledConfig:
+    cronCache.update(compiledConfig['cron'])
+    cronWeeks.update(compiledConfig['weeks'])
+  buttonPins = loadTasks(currentDate, compiled = compiledConfig['tasks'] if compiledConfig else None)
+  if compiledConfig:
+    logger.info('compiled config taken from %s', args.configCache)
+  else:
+    for level, message in configProblems():
+      logger.log(level, '%s', message)
+    saveConfigCache()
+  resetTitles(currentDate)
+  logger.log(logging.DEBUG-2, 'config["Title 0"] = %s', LazyPformat(config['Title 0']))
 
-  write_ws281x('brightness ' + str(ws281x['PWMchannel']) + ',' + \
-     ws281x['Brightness'] + \
-     '\nrender\n')
-     
-  config['Title 0']['currentColor'] = 'off'
-  config['Title 0']['next allowed'] = currentDate
-  config['Title 0']['state'] = 'starting'
-  
-  logger.log(logging.DEBUG-2, 'config["Title 0"] = ' + pp.pformat(config['Title 0']))
-  
-  currentDate = datetime.now()
-  for section in config.keys():
-    if 'led_start' in config[section]:
-      maxTemp = int(config[section]['led_start']) + int(config[section]['led_length'])
-      if maxTemp > ws281x['LedCount']:
-        ws281x['LedCount'] = maxTemp
-    
+  logger.log(logging.DEBUG-4, "list of tasks = \r\n%s", LazyPformat(list(tasks.keys())))
+  logger.log(logging.DEBUG-5, "tasks = \r\n%s", LazyPformat(tasks))
 
-    if 'deadline' in config[section]:
-      if ';' in config[section]['deadline']:
-        deadlineList = [x.strip() for x in config[section]['deadline'].split(';')]
-        logger.log(logging.DEBUG-2, section+"'s deadlineList = " + pp.pformat(deadlineList))
-
-        config[section]['grace'] = deadlineList[0]
-        config[section]['deadline'] = deadlineList[1]
-        config[section]['persist'] = deadlineList[2]
-
-    logger.debug("section = " + section + \
-                 ", led_start = " + config[section]['led_start'] if 'led_start' in config[section] else "" + \
-                 ", gpio_pin = " + config[section]['gpio_pin'] if 'gpio_pin' in config[section] else "" + \
-                 (", led_length = " + config[section]['led_length']  + \
-                 ", ws281x['LedCount'] = " + str(ws281x['LedCount']-1)) if 'led_length' in config[section] else "" + \
-                 ', deadline = "' + config[section]['deadline'] + '"' if 'deadline' in config[section] else "" \
-                 )
-
-    if 'gpio_pin' in config[section]:
-      if config[section]['gpio_pin'].isdigit() and ('deadline' in config[section]):
-
-        ''' set glitch filter level either from last GPIO or Title or argument '''
-        if 'glitch' in config[section].keys(): # if found in section
-          glitch = int(config[section]['glitch']) # then go with it.
-        elif 'glitch' in config['Title 0'].keys(): # if found in Title 0
-          glitch = int(config['Title 0']['glitch'])
-        else:
-          glitch = int(args.glitch) # default
-        buttonPins[int(config[section]['gpio_pin'])] = glitch
-        tasks[section] = config[section]
-        tasks[section]['crontab'] = CronTab(tasks[section]['deadline'])
-        tasks[section]['PendingDueDate'], tasks[section]['PendingGraceDate'], tasks[section]['PendingToLateDate'] = getNextDeadLine(currentDate, tasks[section])
-        tasks[section]['currentColor'] = 'off'
-        tasks[section]['ButtonReleases'] = [tasks[section]['PendingGraceDate'] - timedelta(seconds=1)]
-        tasks[section]['ButtonPresses'] = [tasks[section]['PendingGraceDate'] - timedelta(seconds=1)]
-        tasks[section]['state'] = None
-      
-  logger.log(logging.DEBUG-4, "list of tasks = \r\n" + pp.pformat(list(tasks.keys())))
-  logger.log(logging.DEBUG-5, "tasks = \r\n" + pp.pformat(tasks))
-
-  logger.debug("Max LED position found to be " + str(ws281x['LedCount'] - 1))
-  logger.debug("dict of pins = " + pp.pformat(buttonPins))
+  for channel, strip in strips.items():
+    logger.debug("Max LED position of channel %d found to be %d", channel, strip['LedCount'] - 1)
+  logger.debug("dict of pins = %s", LazyPformat(buttonPins))
+
+  ''' pick up where the last run left off, e.g. a chore already completed before a restart '''
+  cleanShutdown = replayHistory(currentDate)
 
-  #### POST - Neopixel Pre Operating Self Tests ####
   logger.debug("initializing ws2812svr")
-  
-  write_ws281x('setup {0},{1},{2},{3},{4},{5}\ninit\n'.format(ws281x['PWMchannel'], ws281x['LedCount'], ws281x['LedType'], ws281x['Invert'], ws281x['Brightness'], ws281x['NeopixelPin']))
-  for colorName in ['red', 'grn', 'blu', 'off']:
-    logger.debug("POST LED test of ALL " + colorName)
-    write_ws281x('fill ' + str(ws281x['PWMchannel']) + ',' + colors[colorName] + '\nrender\n')
-    sleep(args.postDelay)
-
-  for colorName in ['wht', 'off']:
-    logger.debug("POST LED test of Title " + colorName)
-    write_ws281x('fill ' + str(ws281x['PWMchannel']) + ',' + \
-                 colors[colorName]  + ',' + \
-                 str(config['Title 0']['led_start']) + ',' + \
-                 str(int(config['Title 0']['led_length'])) + \
-                 '\nrender\n')
-    sleep(args.postDelay)
+  setup_ws281x()
+
+  #### POST - Neopixel Pre Operating Self Tests ####
+  ''' the tool modes below run the POST up front, the board runs it from the scheduler once the buttons are live '''
+  toolMode = args.walkLED or args.stop or args.haltOnColor
+  if args.post == 'always' or (args.post == 'auto' and not cleanShutdown):
+    postFrames.extend(buildPostFrames())
+  elif args.post == 'auto':
+    logger.info('skipping POST, the last shutdown was clean')
+  if toolMode:
+    while postFrames:
+      showPostFrame()
+      clock.sleep(args.postDelay)
+    showPostFrame()
 
   #### used to locate LEDs on device
   if args.walkLED:
@@ -232,23 +1095,23 @@ def main():
 
   #### halt if command line requested pause on fill of color.
   if args.haltOnColor :
-    logger.info('Option set to just stay all ' + args.haltOnColor)
+    logger.info('Option set to just stay all %s', args.haltOnColor)
     if args.haltOnColor.lower() == 'rainbow' :
-      write_ws281x('rainbow ' + str(ws281x['PWMchannel']) + '\nrender\n')
+      for channel in strips:
+        queue_ws281x('rainbow ' + str(channel) + '\n')
     elif args.haltOnColor.lower() == 'stickers' :
       palete = ['red', 'grn', 'blu', 'ylw', 'brw', 'prp', 'wht']
       for section in tasks.keys():
-        write_ws281x('fill ' + str(ws281x['PWMchannel']) + ',' + \
-                     colors[palete[0]]  + ',' + \
-                     str(tasks[section]['led_start']) + ',' + \
-                     str(int(tasks[section]['led_length'])) + \
-                     '\nrender\n')
+        fill_ws281x(colors[palete[0]], tasks[section].led_start, tasks[section].led_length, tasks[section].channel)
         palete = ([palete[-1]] + palete[0:-1])
     else:
-      write_ws281x('fill ' + str(ws281x['PWMchannel']) + ',' + colors[args.haltOnColor] + '\nrender\n')
+      fill_ws281x(colors[args.haltOnColor])
+    flush_ws281x()
+    if args.haltOnColor.lower() == 'rainbow' :
+      resync_ws281x() # the rainbow is not in the frame buffer
     logger.info('pausing on haltOnColor')
     while True:
-      pass
+      signal.pause() # until SIGINT or SIGTERM exits
     pi.stop()
     quit()
 
@@ -256,181 +1119,341 @@ def main():
   if not pi.connected:
      exit()
 
-  cb = []
+  armButtons(buttonPins)
+
+  ''' seed the button levels with one bulk read, from here on the callbacks keep them current '''
+  bank = pi.read_bank_1()
   for buttonPin in buttonPins:
-    ''' config each used GPIO pins '''
-    pi.set_mode(buttonPin, pigpio.INPUT)
-    pi.set_pull_up_down(buttonPin, pigpio.PUD_UP)
-    pi.set_glitch_filter(buttonPin, buttonPins[buttonPin])
-    cb.append(pi.callback(buttonPin, pigpio.EITHER_EDGE, cbf_button))
+    buttonLevels.setdefault(buttonPin, (bank >> buttonPin) & 1 if buttonPin < 32 else pi.read(buttonPin))
+  logger.info('buttons armed')
+
+  ''' from here on the config can be reloaded, by SIGHUP or when its files change '''
+  signal.signal(signal.SIGHUP, reload_handler)
+
+  if args.statusHttp:
+    startStatusServer()
 
   #### Main Loop
+  ''' every task is evaluated once at start up, afterwards only when its next transition is due or its button changed '''
+  for section in tasks.keys():
+    armSchedule(section, currentDate)
+  armSchedule('Title 0', currentDate)
+  if postFrames:
+    armSchedule('POST', currentDate)
+  if args.watchConfig:
+    armSchedule('watchConfig', currentDate + timedelta(seconds = args.watchConfig))
+
   try:
     while True:
-      currentDate = datetime.now()
-
-      ''' Determine and or adjust for change in Day or Night Time Mode of LED brightness '''
-      if config['Title 0']['dawn'] < currentDate <= config['Title 0']['sunset']:
-        ''' if we have ran thru the dawn then change to Day Time Mode and get next dawn '''
-        logger.info('Time to brighten the LEDs')
-        config['Title 0']['dawn'], _ = getSunUPandSunDown(date.today() + timedelta(days = 1)) # get next dawn
-        logger.log(logging.DEBUG-2, 'config["Title 0"] = ' + pp.pformat(config['Title 0']))
-        ws281x['Brightness'] = config['Title 0']['brightness']
-        write_ws281x('brightness ' + str(ws281x['PWMchannel']) + ',' + \
-             ws281x['Brightness'] + \
-             '\nrender\n')
-      elif config['Title 0']['sunset'] < currentDate :
-        ''' if we have ran thru the sunset then change to Day Time Mode and get sunset dawn '''
-        logger.info('Time to dim the LEDs')
-        config['Title 0']['dawn'], config['Title 0']['sunset'] = getSunUPandSunDown(date.today() + timedelta(days = 1)) # get next sunset
-        logger.log(logging.DEBUG-2, 'config["Title 0"] = ' + pp.pformat(config['Title 0']))
-        ws281x['Brightness'] = config['Title 0']['nightbrightness']
-        write_ws281x('brightness ' + str(ws281x['PWMchannel']) + ',' + \
-             ws281x['Brightness'] + \
-             '\nrender\n')
-      
-      config['Title 0']['listState'] = []
-      
-      ''' Check for Button Changes '''
-      for section in tasks.keys():
-        if tasks[section]['gpio_pin'].isdigit():
-
-          ''' determine new state if needed '''
-          priorState = tasks[section]['state']
-          if ((currentDate <= tasks[section]['PendingGraceDate']) and (tasks[section]['state'] != 'beforeGrace')):
-            ''' is it before the start of grace period, aka not yet expected to be started '''
-            tasks[section]['state'] = 'beforeGrace'
-          elif ((tasks[section]['PendingGraceDate'] < tasks[section]['ButtonReleases'][-1] <= tasks[section]['PendingToLateDate']) and (tasks[section]['state'] != 'completed')):
-            ''' is it between start of Grace and End of TO Late, aka is not completed '''
-            tasks[section]['state'] = 'completed'
-          elif ((tasks[section]['PendingGraceDate'] < currentDate <= tasks[section]['PendingDueDate']) and not (tasks[section]['state'] in ['completed', 'pending'])) :
-            ''' is it between start of Grace and Expected Dead Line, aka was it completed On Time '''
-            tasks[section]['state'] = 'pending'
-          elif ((tasks[section]['PendingDueDate'] < currentDate <= tasks[section]['PendingToLateDate']) and not (tasks[section]['state'] in ['completed', 'late'])) :
-            ''' is it before Expected Dead Line, aka was it completed late '''
-            tasks[section]['state'] = 'late'
-          elif (tasks[section]['PendingToLateDate'] < currentDate) and tasks[section]['state'] != 'off':
-            ''' if after deadline and if not off then turn off and set new deadlines, aka is it just over '''
-            tasks[section]['state'] = 'off'
-            tasks[section]['PendingDueDate'], tasks[section]['PendingGraceDate'], tasks[section]['PendingToLateDate'] = getNextDeadLine(currentDate, tasks[section])
-          else: 
-            ''' no state change '''
-            pass 
-          
-          ''' log state change and determine new deadlines if needed '''
-          if priorState != tasks[section]['state']:
-            logger.debug('tasks[' + section + '] Changing state from ' + str(priorState) + ' to ' + tasks[section]['state'])
-            if tasks[section]['state'] == 'completed':
-                newNextAllowedDate = currentDate + timedelta(seconds = args.buttonDelay)
-                if newNextAllowedDate > config['Title 0']['next allowed']:
-                    config['Title 0']['next allowed'] = newNextAllowedDate
-                    logger.debug(' next allowed button is after ' + config['Title 0']['next allowed'].strftime('%Y-%m-%d %a %H:%M:%S'))
-
-          ''' check if button is not being depressed '''
-          if (pi.read(int(tasks[section]['gpio_pin'])) != 0) :
-            ''' determine new color if needed '''
-            priorColor = tasks[section]['currentColor']
-            if tasks[section]['state'] in ['off', 'beforeGrace'] and priorColor != 'off':
-              tasks[section]['currentColor'] = 'off'
-
-            elif tasks[section]['state'] == 'pending' and priorColor != 'ylw' :
-              tasks[section]['currentColor'] = 'ylw'
-
-            elif tasks[section]['state'] == 'late' and priorColor != 'red':
-              tasks[section]['currentColor'] = 'red'
-
-            elif tasks[section]['state'] == 'completed' and priorColor != 'grn':
-              tasks[section]['currentColor'] = 'grn'
-
-            ''' update LED if color change '''
-            if priorColor != tasks[section]['currentColor']:
-              logger.log(logging.DEBUG-4, "tasks["+section+"] = " + pp.pformat(tasks[section]) )
-              write_ws281x('fill ' + str(ws281x['PWMchannel']) + ',' + \
-                           colors[tasks[section]['currentColor']]  + ',' + \
-                           str(tasks[section]['led_start']) + ',' + \
-                           str(int(tasks[section]['led_length'])) + \
-                           '\nrender\n')
-        
-        config['Title 0']['listState'].append(tasks[section]['state'])
-
-      priorTitle0State = config['Title 0']['state']
-      if any(s in config['Title 0']['listState'] for s in ('pending', 'late')):
-        config['Title 0']['state'] = 'incomplete'
-      else:
-        if 'completed' in config['Title 0']['listState']:
-          config['Title 0']['state'] = 'complete'
-        else:
-          config['Title 0']['state'] = 'off'          
-      
-      if args.statusFile is not None:
-        if priorTitle0State != config['Title 0']['state']:
-          logger.log(logging.DEBUG-1, "updating '" + args.statusFile + "' with " + config['Title 0']['state'] + "'")
-          status_file = open(args.statusFile, "w")
-          status_file.write(config['Title 0']['state'])
-          status_file.close()
-
-      priorTitleColor = config['Title 0']['currentColor']
-      if config['Title 0']['state'] == 'complete':
-        config['Title 0']['currentColor'] = 'grn'
-      else:
-        config['Title 0']['currentColor'] = 'off'
-
-      if priorTitleColor != config['Title 0']['currentColor']:
-        logger.log(logging.DEBUG-4, "config["+'Title 0'+"] = " + pp.pformat(config['Title 0']) )
-        write_ws281x('fill ' + str(ws281x['PWMchannel']) + ',' + \
-                     colors[config['Title 0']['currentColor']]  + ',' + \
-                     str(config['Title 0']['led_start']) + ',' + \
-                     str(int(config['Title 0']['led_length'])) + \
-                     '\nrender\n')
-        
-      sleep(1)
+      runSchedule(clock.now())
+
+      ''' sleep until the next scheduled transition or until a button callback queues an edge '''
+      timeout = (schedule[0][0] - clock.now()).total_seconds() if schedule else maxIdleSleep
+      item = clock.wait(buttonEdges, min(max(timeout, 0), maxIdleSleep))
+      if item is not None:
+        applyQueued(item)
 
   except KeyboardInterrupt:
      print("\nTidying up")
-     for c in cb:
-        c.cancel()
+  except SimulationEnd:
+     endSimulation()
+  closeHistory(clean = True)
+  for callback, glitch in buttonCallbacks.values():
+     callback.cancel()
   pi.stop()
 
 #end of main():
 
-def getSunUPandSunDown(when = datetime.now()):
+def runSchedule(currentDate):
+  ''' apply the queued button edges, evaluate the sections that are due or whose button changed, then render once '''
+  started = perf_counter()
+  drainButtonEdges()
+  dueSections = popDueSections(currentDate)
+  if buttonSections and postFrames:
+    ''' somebody is using the board, cut the POST short '''
+    postFrames.clear()
+    dueSections.add('POST')
+  while buttonSections:
+    dueSections.add(buttonSections.pop())
+
+  ''' Check for Button Changes and deadlines '''
+  while dueSections:
+    for section in dueSections:
+      if section == 'Title 0':
+        ''' Determine and or adjust for change in Day or Night Time Mode of LED brightness '''
+        updateBrightness(currentDate)
+        armSchedule(section, min(config['Title 0']['dawn'], config['Title 0']['sunset']) + timedelta(microseconds = 1))
+      elif section == 'POST':
+        showPostFrame()
+        if postFrames or ledOutput['overlay'] is not None:
+          armSchedule(section, currentDate + timedelta(seconds = args.postDelay))
+      elif section == 'animate':
+        ''' flush_ws281x() below draws the frame, the next one is due a frame later while anything is animated '''
+        if animations:
+          armSchedule(section, currentDate + timedelta(seconds = 1 / args.animate))
+      elif section == 'watchConfig':
+        if configMtimes() != configStamp:
+          reloadConfig(currentDate)
+        armSchedule(section, currentDate + timedelta(seconds = args.watchConfig))
+      elif section not in tasks:
+        ''' removed by a reload '''
+        pass
+      elif updateTask(section, currentDate):
+        ''' state changed, re-evaluate as the state machine may need another step '''
+        armSchedule(section, currentDate)
+      else:
+        armSchedule(section, getNextTransition(section, currentDate))
+    dueSections = popDueSections(currentDate)
+
+  for title in titles:
+    updateTitle(title)
+  flush_ws281x()
+  flushHistory(currentDate)
+  publishStatus(currentDate)
+  metrics['loopPasses'] += 1
+  metrics['loopSeconds'].observe(perf_counter() - started)
+# end of runSchedule():
+
+def armSchedule(section, when):
+  ''' (re)arm the section's next evaluation, any earlier heap entry of the section becomes stale '''
+  scheduled[section] = when
+  heapq.heappush(schedule, (when, section))
+
+def popDueSections(currentDate):
+  ''' return the set of sections whose armed time has been reached, dropping stale entries '''
+  dueSections = set()
+  while schedule and schedule[0][0] <= currentDate:
+    when, section = heapq.heappop(schedule)
+    if scheduled.get(section) == when:
+      del scheduled[section]
+      dueSections.add(section)
+  return dueSections
+
+def getNextTransition(section, currentDate):
+  ''' the state machine changes just after each of the pending dates '''
+  upcoming = [d for d in (tasks[section].PendingGraceDate, tasks[section].PendingDueDate, tasks[section].PendingToLateDate) if d >= currentDate]
+  if not upcoming:
+    return currentDate + timedelta(seconds = maxIdleSleep)
+  return min(upcoming) + timedelta(microseconds = 1)
+
+def updateBrightness(currentDate, force = False):
+  if config['Title 0']['dawn'] < currentDate <= config['Title 0']['sunset']:
+    ''' if we have ran thru the dawn then change to Day Time Mode and get next dawn '''
+    logger.info('Time to brighten the LEDs')
+    config['Title 0']['dawn'], _ = getSunUPandSunDown(clock.now().date() + timedelta(days = 1)) # get next dawn
+    logger.log(logging.DEBUG-2, 'config["Title 0"] = %s', LazyPformat(config['Title 0']))
+    ws281x['Brightness'] = config['Title 0']['brightness']
+    queueBrightness()
+  elif config['Title 0']['sunset'] < currentDate :
+    ''' if we have ran thru the sunset then change to Day Time Mode and get sunset dawn '''
+    logger.info('Time to dim the LEDs')
+    config['Title 0']['dawn'], config['Title 0']['sunset'] = getSunUPandSunDown(clock.now().date() + timedelta(days = 1)) # get next sunset
+    logger.log(logging.DEBUG-2, 'config["Title 0"] = %s', LazyPformat(config['Title 0']))
+    ws281x['Brightness'] = config['Title 0']['nightbrightness']
+    queueBrightness()
+  elif force:
+    ''' a reload may have changed the levels, stay in the current mode, once past today's sunset the next dawn comes first '''
+    ws281x['Brightness'] = config['Title 0']['brightness' if config['Title 0']['sunset'] < config['Title 0']['dawn'] else 'nightbrightness']
+    queueBrightness()
+# end of updateBrightness():
+
+def updateTask(section, currentDate):
+  ''' advance the task's state machine one step, returns True if the state changed '''
+
+  ''' determine new state if needed '''
+  priorState = tasks[section].state
+  if ((currentDate <= tasks[section].PendingGraceDate) and (tasks[section].state != 'beforeGrace')):
+    ''' is it before the start of grace period, aka not yet expected to be started '''
+    tasks[section].state = 'beforeGrace'
+  elif ((tasks[section].PendingGraceDate < tasks[section].ButtonReleases[-1] <= tasks[section].PendingToLateDate) and (tasks[section].state != 'completed')):
+    ''' is it between start of Grace and End of TO Late, aka is not completed '''
+    tasks[section].state = 'completed'
+  elif ((tasks[section].PendingGraceDate < currentDate <= tasks[section].PendingDueDate) and not (tasks[section].state in ['completed', 'pending'])) :
+    ''' is it between start of Grace and Expected Dead Line, aka was it completed On Time '''
+    tasks[section].state = 'pending'
+  elif ((tasks[section].PendingDueDate < currentDate <= tasks[section].PendingToLateDate) and not (tasks[section].state in ['completed', 'late'])) :
+    ''' is it before Expected Dead Line, aka was it completed late '''
+    tasks[section].state = 'late'
+  elif (tasks[section].PendingToLateDate < currentDate) and tasks[section].state != 'off':
+    ''' if after deadline and if not off then turn off and set new deadlines, aka is it just over '''
+    tasks[section].state = 'off'
+    tasks[section].PendingDueDate, tasks[section].PendingGraceDate, tasks[section].PendingToLateDate = getNextDeadLine(currentDate, tasks[section])
+  else: 
+    ''' no state change '''
+    pass 
+  
+  ''' log state change and determine new deadlines if needed '''
+  if priorState != tasks[section].state:
+    logger.debug('tasks[%s] Changing state from %s to %s', section, priorState, tasks[section].state)
+    recordHistory('S', section, currentDate, tasks[section].state, int(tasks[section].PendingDueDate.timestamp()))
+    if tasks[section].state == 'completed':
+        newNextAllowedDate = currentDate + timedelta(seconds = args.buttonDelay)
+        timing = pinTiming(tasks[section].gpio_pin)
+        if newNextAllowedDate > timing['next allowed']:
+            timing['next allowed'] = newNextAllowedDate
+            logger.debug(' next allowed press of gpio_pin %d is after %s', tasks[section].gpio_pin, LazyStrftime(timing['next allowed']))
+
+  ''' check if button is not being depressed, if it is the release callback will bring us back '''
+  if buttonLevels.get(tasks[section].gpio_pin, 1) != 0 :
+    ''' determine new color if needed '''
+    priorColor = tasks[section].currentColor
+    if tasks[section].state in ['off', 'beforeGrace'] and priorColor != 'off':
+      tasks[section].currentColor = 'off'
+
+    elif tasks[section].state == 'pending' and priorColor != 'ylw' :
+      tasks[section].currentColor = 'ylw'
+
+    elif tasks[section].state == 'late' and priorColor != 'red':
+      tasks[section].currentColor = 'red'
+
+    elif tasks[section].state == 'completed' and priorColor != 'grn':
+      tasks[section].currentColor = 'grn'
+
+    ''' update LED if color change '''
+    if priorColor != tasks[section].currentColor:
+      logger.log(logging.DEBUG-4, "tasks[%s] = %s", section, LazyPformat(tasks[section]))
+      fill_ws281x(colors[tasks[section].currentColor], tasks[section].led_start, tasks[section].led_length, tasks[section].channel)
+      animateTask(section, priorColor)
+
+  return priorState != tasks[section].state
+# end of updateTask():
+
+def updateTitle(title):
+  config[title]['listState'] = [tasks[section].state for section in titles[title]]
+
+  priorTitleState = config[title]['state']
+  if any(s in config[title]['listState'] for s in ('pending', 'late')):
+    config[title]['state'] = 'incomplete'
+  else:
+    if 'completed' in config[title]['listState']:
+      config[title]['state'] = 'complete'
+    else:
+      config[title]['state'] = 'off'
+
+  if args.statusFile is not None:
+    if priorTitleState != config[title]['state']:
+      statusFile = statusFileName(title)
+      logger.log(logging.DEBUG-1, "updating '%s' with '%s'", statusFile, config[title]['state'])
+      status_file = open(statusFile, "w")
+      status_file.write(config[title]['state'])
+      status_file.close()
+
+  priorTitleColor = config[title]['currentColor']
+  if config[title]['state'] == 'complete':
+    config[title]['currentColor'] = 'grn'
+  else:
+    config[title]['currentColor'] = 'off'
+
+  if priorTitleColor != config[title]['currentColor']:
+    logger.log(logging.DEBUG-4, "config[%s] = %s", title, LazyPformat(config[title]))
+    fill_ws281x(colors[config[title]['currentColor']], config[title]['led_start'], config[title]['led_length'], config[title]['channel'])
+    if args.animate and config[title]['state'] == 'complete' and priorTitleState != 'starting':
+      ''' all done, chase hues across the title and its tasks before they settle on green '''
+      startAnimation(title, 'celebrate', [(config[title]['channel'], config[title]['led_start'], config[title]['led_length'])] +
+                     [(tasks[section].channel, tasks[section].led_start, tasks[section].led_length) for section in titles[title]], colors['grn'])
+# end of updateTitle():
+
+def statusFileName(title):
+  ''' --statusFile for Title 0, with the title's number added for the others, e.g. choreBoard-1.status '''
+  if title == 'Title 0':
+    return args.statusFile
+  root, ext = os.path.splitext(args.statusFile)
+  return '%s-%s%s' % (root, title.split(' ', 1)[1], ext)
+
+def getLocation():
+  ''' latitude and longitude from [Title 0], else from the location cache, else a one time IP geolocation '''
+  if 'latitude' in config['Title 0'] and 'longitude' in config['Title 0']:
+    return float(config['Title 0']['latitude']), float(config['Title 0']['longitude'])
+  if not args.locationCache:
+    logger.info('no latitude and longitude in [Title 0], dawn and sunset default to %s and %s', fallbackSun[0], fallbackSun[1])
+    return None
+
+  try:
+    with open(args.locationCache) as cache_file:
+      cached = json.load(cache_file)
+    logger.log(logging.DEBUG-3, 'Geolocation cached : lat=%s lng=%s', cached['latitude'], cached['longitude'])
+    return float(cached['latitude']), float(cached['longitude'])
+  except (OSError, ValueError, KeyError, TypeError):
+    pass
 
-  # geolocate dawn and sunset
   try:
+    import geocoder # only needed the first time, it pulls in requests and is slow to import
     g = geocoder.ip('me')
-    logger.log(logging.DEBUG-3, 'Geolocation found = ' + pp.pformat(g.lat))
-    logger.log(logging.DEBUG-3, 'Geolocation found : lat=' + str(g.lat) + ' lng=' + str(g.lng))
-    l = Location()
-    l.latitude = g.lat
-    l.longitude = g.lng
-    l.timezone = 'US/Eastern'
-    dawn = l.sun(when)['dawn'].replace(tzinfo=None)
-    sunset = l.sun(when)['sunset'].replace(tzinfo=None)
-    logger.log(logging.DEBUG-3, 'Todays dawn = ' + pp.pformat(dawn))
-    logger.log(logging.DEBUG-3, 'Todays sunset = ' + pp.pformat(sunset))
-    return dawn, sunset
-  except:
-    return None, None
+  except Exception as e:
+    logger.warning('Geolocation failed: %s', e)
+    return None
+  if g.lat is None or g.lng is None:
+    logger.warning('Geolocation failed, set latitude and longitude in [Title 0]')
+    return None
+  logger.log(logging.DEBUG-3, 'Geolocation found : lat=%s lng=%s', g.lat, g.lng)
+
+  try:
+    with open(args.locationCache, 'w') as cache_file:
+      json.dump({'latitude' : g.lat, 'longitude' : g.lng}, cache_file)
+  except OSError as e:
+    logger.warning('unable to cache location in %s: %s', args.locationCache, e)
+  return float(g.lat), float(g.lng)
+# end of getLocation():
+
+def getSunUPandSunDown(when = None):
+  ''' dawn and sunset of the day of when, computed locally for a window of days at a time '''
+  global sunLocation
+
+  if when is None:
+    when = clock.now().date()
+  elif isinstance(when, datetime):
+    when = when.date()
+
+  if when not in sunTimes:
+    if sunLocation is None:
+      sunLocation = getLocation()
+    l = None
+    if sunLocation is not None:
+      l = Location()
+      l.latitude, l.longitude = sunLocation
+      l.timezone = config['Title 0']['timezone']
+    sunTimes.clear()
+    for day in (when + timedelta(days = n) for n in range(sunWindowDays)):
+      sunTimes[day] = datetime.combine(day, fallbackSun[0]), datetime.combine(day, fallbackSun[1])
+      if l is not None:
+        try:
+          sun = l.sun(day)
+          sunTimes[day] = sun['dawn'].replace(tzinfo=None), sun['sunset'].replace(tzinfo=None)
+        except AstralError as e: # the sun does not rise or set (polar day/night)
+          logger.warning('no dawn or sunset on %s: %s', day, e)
+    logger.log(logging.DEBUG-3, 'sun times = %s', LazyPformat(sunTimes))
+
+  dawn, sunset = sunTimes[when]
+  logger.log(logging.DEBUG-3, 'Todays dawn = %s', dawn)
+  logger.log(logging.DEBUG-3, 'Todays sunset = %s', sunset)
+  return dawn, sunset
+# end of getSunUPandSunDown():
 
 def walk_leds():
   '''repo and manual is located at https://github.com/tom-2015/rpi-ws2812-server'''
   global ws281x
-  for pos in range(ws281x['LedCount']):
-    write_ws281x('fill ' + str(ws281x['PWMchannel']) + ',' + \
-                           colors['red']  + ',' + \
-                           str(pos) + ',' + \
-                           '1' + \
-                           '\nrender\n')
-    logger.debug('LED Index = ' + str(pos))
+  for channel, strip in strips.items():
+    for pos in range(strip['LedCount']):
+      fill_ws281x(colors['red'], pos, 1, channel)
+      flush_ws281x()
+      logger.debug('channel %d LED Index = %d', channel, pos)
+
+      try:
+        input("Press enter to continue")
+      except EOFError:
+        exit()
+
+      fill_ws281x(colors['off'])
+      flush_ws281x()
+  exit()
 
+def parseDateTime(value):
+  for dateFormat in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
     try:
-        eval(input("Press enter to continue"))
-    except SyntaxError:
-        pass
-
-    write_ws281x('fill ' + str(ws281x['PWMchannel']) + ',' + colors['off'] + '\nrender\n')
-    pos = pos + 1
-  exit()
+      return datetime.strptime(value, dateFormat)
+    except ValueError:
+      pass
+  raise argparse.ArgumentTypeError('%s is not a "YYYY-MM-DD HH:MM:SS" date' % value)
 
 def checkNotNegative(value):
     ivalue = int(value)
@@ -441,6 +1464,9 @@ def checkNotNegative(value):
 def ParseArgs():
   global args
   global config
+  global configRaw
+  global configStamp
+  global compiledConfig
   global fn
   global ws281x
 
@@ -451,31 +1477,79 @@ def ParseArgs():
   parser.add_argument('--verbose', '-v', action='count', help='verbose multi level', default=1)
   parser.add_argument('--config', '-c', help='specify config file', default=(os.path.join(os.path.dirname(os.path.realpath(__file__)), fn + ".ini")))
   parser.add_argument('--io', help='specify pin and led file', default=(os.path.join(os.path.dirname(os.path.realpath(__file__)), fn + ".io")))
-  parser.add_argument('--ws281x', '-w', help='specify ws281x file handle', default="/dev/ws281x")
+  parser.add_argument('--ws281x', '-w', help='specify ws281x file handle, tcp://host:port of ws2812svr or memory:// to record in memory, default is /dev/ws281x (memory:// with --simulate)')
+  parser.add_argument('--ws281xClose', action='store_true', help='close the ws281x file handle after every render, for ws2812svr builds that wait for EOF')
   parser.add_argument('--brightness', '-b', help='specify intensity for ws281x 0-255 (off/full) after sunrise')
   parser.add_argument('--nightbrightness', '-n', help='same as brightness for after sunset')
   parser.add_argument('--timezone', '-z', help='specify local timezone, default is US/Eastern')
+  parser.add_argument('--locationCache', help='file caching the geolocated latitude and longitude, when not set in [Title 0], "" to not geolocate and use 6:00 and 20:00 for dawn and sunset. Default is next to the script, none with --simulate')
   parser.add_argument('--stop', '-s', action='store_true', help='just initialize and stop')
   parser.add_argument('--lightbutton', '-u', action='store_true', help='illuminate buttons when pressed')
   parser.add_argument('--haltOnColor', '-a', help='specify [color], "rainbow" or "sticker" to pause on. Recommend having dim brightenss')
   parser.add_argument('--postDelay', '-p', help='specify the LED delays at startup, in seconds', type=float, default="0.25")
+  parser.add_argument('--post', choices=['auto', 'always', 'never'], help='run the POST LED test at startup, auto skips it when the last shutdown was clean (needs --history)', default='auto')
+  parser.add_argument('--animate', help='frames per second of LED animations, fading between colors, pulsing late chores and celebrating a completed title, 0 for static colors', type=checkNotNegative, default=0)
   parser.add_argument('--walkLED', '-L', action='store_true', help='move LED increamentally, with standard input, used for determining LED positions.')
   parser.add_argument('--glitch', '-g', help='debounce period in ms for GPIO', default=100)
-  parser.add_argument('--buttonDelay', '-d', help='period before allowing another button', type=checkNotNegative, default=60)
+  parser.add_argument('--buttonDelay', '-d', help='seconds a button is locked after completing a chore, a double press gets past it', type=checkNotNegative, default=60)
+  parser.add_argument('--debounce', help='ms after a release in which a press is taken as contact bounce, on top of --glitch', type=checkNotNegative, default=30)
+  parser.add_argument('--longPress', help='ms a button is held to undo the completion of its chore', type=checkNotNegative, default=2000)
+  parser.add_argument('--doublePress', help='most ms between the two presses of a double press', type=checkNotNegative, default=400)
+  parser.add_argument('--history', help='append-only completion history, replayed at start up so completed chores survive a restart, "" to disable. Default is next to the script, none with --simulate')
+  parser.add_argument('--historySync', help='minimum seconds between fsyncs of the history, batching SD card writes', type=checkNotNegative, default=60)
   parser.add_argument('--statusFile', '-f', help='file to store simple status message of either "off" or "complete"', default=(os.path.join(tempfile.gettempdir(), fn + ".status")))
+  parser.add_argument('--statusHttp', help='serve the status as JSON on http://[host:]port/status and Prometheus metrics on /metrics, host defaults to localhost')
+  parser.add_argument('--configCache', help='file keeping the compiled config, used while the INI and IO files are unchanged, "" to disable. Default is next to the script, none with --simulate')
+  parser.add_argument('--checkConfig', action='store_true', help='compile the INI and IO files, report overlapping LEDs, shared pins and misplaced sections, then exit, non-zero on problems')
+  parser.add_argument('--preview', nargs='+', metavar='TIME', type=parseDateTime, help='print what every task and title shows from START to END, or at START when only it is given, "YYYY-MM-DD [HH:MM:SS]", from the deadlines alone, then exit')
+  parser.add_argument('--previewFormat', choices=['text', 'csv', 'json'], help='--preview as a text table, CSV or JSON', default='text')
+  parser.add_argument('--report', nargs='*', metavar='LOG', help='count on time, late and missed chores, the median minutes from the deadline to completion and the streaks of on time ones per task and title, from the debug lines of the LOG files, their rotated and gzipped ones included, and the --history, then exit. Default LOG is ' + logFileName())
+  parser.add_argument('--reportState', help='file keeping the --report counts and how far each file was read, so the next --report only reads what was added, "" to disable. Default is next to the script, none with --simulate')
+  parser.add_argument('--reportFormat', choices=['text', 'json'], help='--report as a text table or JSON', default='text')
+  parser.add_argument('--watchConfig', help='seconds between checks of the INI and IO files for changes, 0 to only reload on SIGHUP. Default is %d, as often as an idle main loop wakes anyway, 0 with --simulate' % maxIdleSleep, type=checkNotNegative)
+  parser.add_argument('--logFlush', help='most seconds log records wait in RAM before they are written, warnings are written at once', type=checkNotNegative, default=5)
+  parser.add_argument('--logRing', help='keep only the last N log records in RAM, written to the log file when a warning is logged or on SIGUSR1, 0 writes every record', type=checkNotNegative, default=0)
+  parser.add_argument('--simulate', action='store_true', help='run without hardware, with a simulated GPIO, LED strip and clock')
+  parser.add_argument('--simulateStart', help='virtual start time "YYYY-MM-DD HH:MM:SS", default is now', type=parseDateTime, default=None)
+  parser.add_argument('--simulateDays', help='days of virtual time to run', type=float, default=1)
+  parser.add_argument('--simulateButtons', help='file of scripted button edges, lines of "YYYY-MM-DD HH:MM:SS gpio_pin level" or "+seconds gpio_pin level", level is 0, 1 or press')
+  parser.add_argument('--simulateOutput', help='file to write the recorded ws281x commands to')
 
   # Read in and parse the command line arguments
   args = parser.parse_args()
+  if args.preview and len(args.preview) > 2:
+    parser.error('--preview takes START and an optional END')
+  if args.preview and len(args.preview) == 2 and args.preview[1] <= args.preview[0]:
+    parser.error('--preview END has to be after START')
+  if args.ws281x is None:
+    args.ws281x = 'memory://' if args.simulate else '/dev/ws281x'
+  if args.simulateStart is None:
+    args.simulateStart = datetime.now().replace(microsecond = 0)
+  if args.configCache is None and not args.simulate:
+    args.configCache = os.path.join(os.path.dirname(os.path.realpath(__file__)), fn + ".cache")
+  if args.watchConfig is None:
+    args.watchConfig = 0 if args.simulate else maxIdleSleep
+  if args.locationCache is None and not args.simulate:
+    args.locationCache = os.path.join(os.path.dirname(os.path.realpath(__file__)), fn + ".location")
+  if args.history is None and not args.simulate:
+    args.history = os.path.join(os.path.dirname(os.path.realpath(__file__)), fn + ".history")
+  if args.reportState is None and not args.simulate:
+    args.reportState = os.path.join(os.path.dirname(os.path.realpath(__file__)), fn + ".report")
 
   os.path.join(os.path.dirname(os.path.realpath(__file__)), args.config)
   os.path.join(os.path.dirname(os.path.realpath(__file__)), args.io)
 
-  # Read in configuration file and create dictionary object
-  configParse = configparser.ConfigParser()
-  configParse.read(args.config)
-  if os.path.exists(args.io): # read in IO pin defintions if in another file
-    configParse.read(args.io)
-  config = {s:dict(configParse.items(s)) for s in configParse.sections()} # convert object to dictionary.
+  # Read in configuration file and create dictionary object, or take it from the cache when the files did not change
+  configStamp = configMtimes()
+  compiledConfig = None if args.checkConfig else loadConfigCache()
+  try:
+    configRaw = compiledConfig['raw'] if compiledConfig else readConfig()
+  except configparser.Error as e:
+    if not args.checkConfig:
+      raise
+    print('error: %s' % e)
+    sys.exit(1)
+  config = copy.deepcopy(configRaw)
 
   if args.brightness is not None:
     ws281x['Brightness'] = args.brightness
@@ -483,6 +1557,29 @@ def ParseArgs():
     ws281x['Brightness'] = config['Title 0']['brightness']
   assert 0 < int(ws281x['Brightness']) < 256
 
+  configDefaults(config)
+# end of ParseArgs():
+
+def configMtimes():
+  ''' modification times of the INI and IO files, None for a missing one '''
+  stamp = []
+  for fileName in (args.config, args.io):
+    try:
+      stamp.append(os.stat(fileName).st_mtime_ns)
+    except OSError:
+      stamp.append(None)
+  return tuple(stamp)
+
+def readConfig():
+  ''' the INI file with the IO file read over it, as {section : {option : value}} '''
+  configParse = configparser.ConfigParser()
+  configParse.read(args.config)
+  if os.path.exists(args.io): # read in IO pin defintions if in another file
+    configParse.read(args.io)
+  return {s:dict(configParse.items(s)) for s in configParse.sections()} # convert object to dictionary.
+
+def configDefaults(config):
+  ''' the [Title 0] options given on the command line or defaulted '''
   if args.timezone is not None:
     config['Title 0']['timezone'] = args.timezone
   elif 'timezone' not in config['Title 0'].keys():
@@ -492,8 +1589,136 @@ def ParseArgs():
     config['Title 0']['nightbrightness'] = args.nightbrightness
   elif 'nightbrightness' not in config['Title 0'].keys():
     config['Title 0']['nightbrightness'] = '10'
+# end of configDefaults():
 
-# end of ParseArgs():
+def configHashes():
+  ''' sha256 of the INI and IO files, None for a missing one '''
+  hashes = []
+  for fileName in (args.config, args.io):
+    try:
+      with open(fileName, 'rb') as configFile:
+        hashes.append(hashlib.sha256(configFile.read()).hexdigest())
+    except OSError:
+      hashes.append(None)
+  return tuple(hashes)
+
+def configCacheKey():
+  ''' what else the compiled tasks depend on, this script and the default glitch '''
+  return (configCacheVersion, os.stat(os.path.realpath(__file__)).st_mtime_ns, str(args.glitch))
+
+def loadConfigCache():
+  ''' the --configCache entry if it was compiled from the INI and IO files as they are now, else None '''
+  if not args.configCache:
+    return None
+  import pickle # off with --simulate and --checkConfig
+  try:
+    with open(args.configCache, 'rb') as cacheFile:
+      cached = pickle.load(cacheFile)
+    if cached['key'] != configCacheKey():
+      return None
+    if cached['stamp'] != configStamp and cached['hashes'] != configHashes():
+      return None
+  except Exception: # missing, truncated or from an older layout, compile from scratch
+    return None
+  return cached
+
+def saveConfigCache():
+  ''' write the raw config and the compiled tasks, without their runtime state, for the next start up '''
+  if not args.configCache:
+    return
+  import pickle
+  cached = { 'key' : configCacheKey(),
+             'stamp' : configStamp,
+             'hashes' : configHashes(),
+             'raw' : configRaw,
+             'tasks' : {section : Task(**{f.name : getattr(task, f.name) for f in fields(Task) if f.name not in taskState})
+                        for section, task in tasks.items()},
+             'cron' : list(cronCache.items()), # upcoming deadlines, still good after a quick restart
+             'weeks' : cronWeeks }
+  try:
+    with open(args.configCache + '.tmp', 'wb') as cacheFile:
+      pickle.dump(cached, cacheFile, pickle.HIGHEST_PROTOCOL)
+    os.replace(args.configCache + '.tmp', args.configCache)
+  except OSError as e:
+    logger.warning('config cache not written: %s', e)
+# end of saveConfigCache():
+
+# Logging goes through a queue to one writer thread, so neither the main loop nor pigpio's callback thread
+# ever waits on the SD card. The writer buffers file records and writes them out in batches.
+logPipeline = { 'queue' : None, # records from any thread, a SimpleQueue as it is safe to put to from a signal handler
+                'writer' : None, # LogWriter thread
+                'handlers' : [], # the writer's handlers, flushed by it
+                'handler' : None, # DroppingQueueHandler of the root logger
+                'ring' : None } # RingHandler with --logRing
+logQueueSize = 10000 # records waiting for the writer before new ones are dropped
+logBufferRecords = 200 # file records buffered before they are written
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+  ''' hands records to the writer thread, dropping rather than blocking once it is logQueueSize behind '''
+  def enqueue(self, record):
+    if self.queue.qsize() >= logQueueSize:
+      metrics['logDropped'] += 1
+      return
+    self.queue.put_nowait(record)
+    metrics['logQueued'] += 1
+
+class LogWriter(logging.handlers.QueueListener):
+  ''' the thread doing all log I/O, it also flushes its buffered handlers every flushSeconds '''
+  def __init__(self, queue, flushSeconds, *handlers):
+    super().__init__(queue, *handlers)
+    self.flushSeconds = flushSeconds
+    self.flushed = perf_counter()
+
+  def dequeue(self, block):
+    if not self.flushSeconds:
+      ''' unbuffered, write out the record just handled before waiting for the next '''
+      for handler in self.handlers:
+        handler.flush()
+      return self.queue.get()
+    while True:
+      wait = self.flushed + self.flushSeconds - perf_counter()
+      if wait <= 0:
+        for handler in self.handlers:
+          handler.flush()
+        self.flushed = perf_counter()
+        continue
+      try:
+        return self.queue.get(timeout = wait)
+      except queue.Empty:
+        pass
+
+class RingHandler(logging.Handler):
+  ''' keeps the last capacity records in RAM, writing them to target only when a WARN+ record arrives '''
+  def __init__(self, capacity, target):
+    super().__init__()
+    self.records = collections.deque(maxlen = capacity)
+    self.target = target
+
+  def emit(self, record):
+    self.records.append(record)
+    if record.levelno >= logging.WARNING:
+      while self.records:
+        self.target.handle(self.records.popleft())
+      self.target.flush()
+
+  def flush(self):
+    self.target.flush()
+
+  def close(self):
+    self.target.close()
+    super().close()
+
+def stopLogging():
+  ''' at exit, let the writer drain the queue and write out what it buffered '''
+  if logPipeline['writer'] is not None:
+    logPipeline['writer'].stop()
+    logPipeline['writer'] = None
+    for handler in logPipeline['handlers']:
+      handler.flush()
+
+def dump_handler(signal, frame):
+  # SIGUSR1, a WARN record makes the writer dump the --logRing, handed to the queue handler alone as its lock is reentrant
+  logPipeline['handler'].handle(logger.makeRecord(logger.name, logging.WARNING, __file__, 0, 'log ring dumped on SIGUSR1', None, None, 'dump_handler'))
 
 logger = None
 def setupLogging():
@@ -505,16 +1730,37 @@ def setupLogging():
   # Setup display and file logging with level support.
   logFormatter = logging.Formatter("%(asctime)s [%(threadName)-12.12s] [%(levelname)-7.7s] (%(funcName)s) %(message)s")
   logger = logging.getLogger()
-  fileHandler = logging.handlers.RotatingFileHandler("{0}/{1}.log".format('/var/log/'+ fn +'/', fn), maxBytes=2*1024*1024, backupCount=2)
-
-  fileHandler.setFormatter(logFormatter)
-  #fileHandler.setLevel(logging.DEBUG)
-  logger.addHandler(fileHandler)
+  handlers = []
+  if args.simulate:
+    # stamp simulation logs with the virtual time, only the console is used
+    logFormatter = logging.Formatter("%(clock)s [%(threadName)-12.12s] [%(levelname)-7.7s] (%(funcName)s) %(message)s")
+  elif not (args.checkConfig or args.preview or args.report is not None):
+    fileHandler = logging.handlers.RotatingFileHandler(logFileName(), maxBytes=2*1024*1024, backupCount=2)
+
+    fileHandler.setFormatter(logFormatter)
+    #fileHandler.setLevel(logging.DEBUG)
+    if args.logRing:
+      ''' only what led up to a warning reaches the SD card '''
+      logPipeline['ring'] = RingHandler(args.logRing, fileHandler)
+      handlers.append(logPipeline['ring'])
+    else:
+      handlers.append(logging.handlers.MemoryHandler(logBufferRecords, logging.WARNING, fileHandler))
 
   consoleHandler = logging.StreamHandler()
   #consoleHandler.setLevel(logging.DEBUG)
   consoleHandler.setFormatter(logFormatter)
-  logger.addHandler(consoleHandler)
+  handlers.append(consoleHandler)
+
+  logPipeline['queue'] = queue.SimpleQueue()
+  logPipeline['handlers'] = handlers
+  logPipeline['handler'] = DroppingQueueHandler(logPipeline['queue'])
+  if args.simulate:
+    logPipeline['handler'].addFilter(ClockFilter()) # the virtual time when the record was made, not when it is written
+  logger.addHandler(logPipeline['handler'])
+  logPipeline['writer'] = LogWriter(logPipeline['queue'], args.logFlush, *handlers)
+  logPipeline['writer'].start()
+  atexit.register(stopLogging) # runs before logging's own shutdown, which would not wait for the writer
+  signal.signal(signal.SIGUSR1, dump_handler)
 
   # Dictionary to translate Count of -v's to logging level
   verb = { 0 : logging.WARN,
@@ -534,23 +1780,15 @@ def setupLogging():
     else:
       logger.setLevel(logging.DEBUG)
 
-  logger.info('Starting script ' + os.path.join(os.path.dirname(os.path.realpath(__file__)), __file__))
-  logger.info('config file = ' + args.config)
-  logger.info('ws281x file handle = ' + args.ws281x)
-  logger.info('POST Delays = ' + str(args.postDelay) + " seconds")
+  logger.info('Starting script %s', os.path.join(os.path.dirname(os.path.realpath(__file__)), __file__))
+  logger.info('config file = %s', args.config)
+  logger.info('ws281x file handle = %s', args.ws281x)
+  logger.info('POST Delays = %s seconds', args.postDelay)
 
   # log which levels of debug are enabled.
-  logger.log(logging.DEBUG-9, "discrete log level = " + str(logging.DEBUG-9))
-  logger.log(logging.DEBUG-8, "discrete log level = " + str(logging.DEBUG-8))
-  logger.log(logging.DEBUG-7, "discrete log level = " + str(logging.DEBUG-7))
-  logger.log(logging.DEBUG-6, "discrete log level = " + str(logging.DEBUG-6))
-  logger.log(logging.DEBUG-5, "discrete log level = " + str(logging.DEBUG-5))
-  logger.log(logging.DEBUG-4, "discrete log level = " + str(logging.DEBUG-4))
-  logger.log(logging.DEBUG-3, "discrete log level = " + str(logging.DEBUG-3))
-  logger.log(logging.DEBUG-2, "discrete log level = " + str(logging.DEBUG-2))
-  logger.log(logging.DEBUG-1, "discrete log level = " + str(logging.DEBUG-1))
-  logger.log(logging.DEBUG,   "discrete log level = " + str(logging.DEBUG  ))
-  logger.info('verbose = ' + str(args.verbose) + ", logger level = " + str(logger.getEffectiveLevel()))
+  for level in range(logging.DEBUG-9, logging.DEBUG+1):
+    logger.log(level, "discrete log level = %d", level)
+  logger.info('verbose = %d, logger level = %d', args.verbose, logger.getEffectiveLevel())
   logger.debug('debug level enabled')
   logger.info('info  level enabled')
   #logger.warn(u'warn  level enabled')
@@ -558,32 +1796,699 @@ def setupLogging():
   #logger.critical(u'critical  level enabled')
 
   # extra levels of DEBUG of configuration file.
-  logger.log(logging.DEBUG-1, "list of config sections = \r\n" + pp.pformat(list(config.keys())))
+  logger.log(logging.DEBUG-1, "list of config sections = \r\n%s", LazyPformat(list(config.keys())))
   first_section_key = list(config.keys())[0]
-  logger.log(logging.DEBUG-2, "first section name = " + pp.pformat(first_section_key))
+  logger.log(logging.DEBUG-2, "first section name = %r", first_section_key)
   first_section_dict = config[first_section_key]
-  logger.log(logging.DEBUG-3, "list of first sections items = \r\n" + pp.pformat(first_section_dict))
+  logger.log(logging.DEBUG-3, "list of first sections items = \r\n%s", LazyPformat(first_section_dict))
   first_sections_first_item = list(first_section_dict.keys())[0]
-  logger.log(logging.DEBUG-4, "config["+first_section_key+"]["+first_sections_first_item+"] = " + config[first_section_key][first_sections_first_item])
-  logger.log(logging.DEBUG-5, "config = " + pp.pformat(config))
+  logger.log(logging.DEBUG-4, "config[%s][%s] = %s", first_section_key, first_sections_first_item, config[first_section_key][first_sections_first_item])
+  logger.log(logging.DEBUG-5, "config = %s", LazyPformat(config))
 # end of setupLogging():
 
+def open_ws281x():
+  ''' connect to ws2812svr, either its FIFO/file or "tcp://host:port" when it runs with -tcp, or the "memory://" recorder '''
+  if args.ws281x == 'memory://':
+    if ledOutput['recorder'] is None:
+      ledOutput['recorder'] = LedRecorder()
+    return ledOutput['recorder']
+  if args.ws281x.startswith('tcp://'):
+    host, port = args.ws281x[len('tcp://'):].rsplit(':', 1)
+    sock = socket.create_connection((host, int(port)))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock.makefile('w')
+  return open(args.ws281x, 'w')
+# end of open_ws281x():
+
+def setupCommand():
+  return ''.join('setup {0},{1},{2},{3},{4},{5}\n'.format(channel, strip['LedCount'], ws281x['LedType'], ws281x['Invert'], ws281x['Brightness'], strip['NeopixelPin'])
+                 for channel, strip in strips.items()) + 'init\n'
+
+def setup_ws281x():
+  ''' initialize ws2812svr and the frame buffer of each strip, init leaves the strips dark '''
+  ledOutput['pixels'] = {channel : bytearray(3 * strip['LedCount']) for channel, strip in strips.items()}
+  ledOutput['shown'] = {channel : bytearray(3 * strip['LedCount']) for channel, strip in strips.items()}
+  ledOutput['overlay'] = None
+  ledOutput['isSetup'] = True
+  write_ws281x(setupCommand())
+
+def queue_ws281x(cmd):
+  ''' hold the command until the next flush_ws281x(), so a tick or callback is a single write and render '''
+  ledOutput['batch'].append(cmd)
+
+def queueBrightness():
+  for channel in strips:
+    queue_ws281x('brightness ' + str(channel) + ',' + str(ws281x['Brightness']) + '\n')
+
+def fill_ws281x(color, start = None, length = None, channel = None):
+  ''' paint every strip, or length LEDs from start of the channel's strip, into the frame buffer '''
+  if start is None:
+    for pixels in ledOutput['pixels'].values():
+      pixels[:] = bytes.fromhex(color) * (len(pixels) // 3)
+    return
+  pixels = ledOutput['pixels'][config['Title 0']['channel'] if channel is None else channel]
+  start = min(int(start), len(pixels) // 3)
+  end = min(start + int(length), len(pixels) // 3)
+  pixels[3*start:3*end] = bytes.fromhex(color) * (end - start)
+
+def buildPostFrames():
+  ''' the POST sequence, all red, green, blue and off, then the titles white and off '''
+  frames = [{channel : bytearray(bytes.fromhex(colors[colorName]) * strip['LedCount']) for channel, strip in strips.items()}
+            for colorName in ('red', 'grn', 'blu', 'off')]
+  frame = {channel : bytearray(3 * strip['LedCount']) for channel, strip in strips.items()}
+  for title in titles:
+    count = strips[config[title]['channel']]['LedCount']
+    start = min(config[title]['led_start'], count)
+    end = min(start + config[title]['led_length'], count)
+    frame[config[title]['channel']][3*start:3*end] = bytes.fromhex(colors['wht']) * (end - start)
+  frames.append(frame)
+  frames.append({channel : bytearray(3 * strip['LedCount']) for channel, strip in strips.items()})
+  return frames
+
+def showPostFrame():
+  ''' show the next POST frame over the board, or once they are done the board again '''
+  ledOutput['overlay'] = postFrames.pop(0) if postFrames else None
+  logger.debug('POST frame %s', 'done' if ledOutput['overlay'] is None else len(postFrames))
+  flush_ws281x()
+
+def repaintBoard():
+  ''' paint every task and title in its current color into the frame buffer '''
+  for task in tasks.values():
+    fill_ws281x(colors[task.currentColor], task.led_start, task.led_length, task.channel)
+  for title in titles:
+    fill_ws281x(colors[config[title]['currentColor']], config[title]['led_start'], config[title]['led_length'], config[title]['channel'])
+
+def startAnimation(key, effect, ranges, color, fromColor = None):
+  ''' replace the key's animation, the scheduler's 'animate' section renders its frames '''
+  animations[key] = Animation(effect, ranges, clock.now(), bytes.fromhex(color), None if fromColor is None else bytes.fromhex(fromColor))
+  if 'animate' not in scheduled:
+    armSchedule('animate', clock.now())
+
+def animateTask(section, priorColor = None):
+  ''' with --animate, pulse the task while it is late, otherwise fade it from priorColor to its current color '''
+  if not args.animate:
+    return
+  task = tasks[section]
+  ranges = [(task.channel, task.led_start, task.led_length)]
+  if task.state == 'late' and task.currentColor == 'red':
+    startAnimation(section, 'pulse', ranges, colors['red'])
+  elif priorColor is not None and priorColor != task.currentColor:
+    startAnimation(section, 'fade', ranges, colors[task.currentColor], colors[priorColor])
+  else:
+    animations.pop(section, None)
+
+def animationFrame(animation, elapsed):
+  ''' the color of each of the animation's ranges elapsed seconds after it began, None once it is over '''
+  if animation.effect == 'fade':
+    if elapsed >= fadeSeconds:
+      return None
+    fraction = elapsed / fadeSeconds
+    return [bytes(round(a + (b - a) * fraction) for a, b in zip(animation.fromColor, animation.color))] * len(animation.ranges)
+  if animation.effect == 'pulse':
+    level = 0.6 + 0.4 * math.cos(2 * math.pi * elapsed / pulseSeconds)
+    return [bytes(round(c * level) for c in animation.color)] * len(animation.ranges)
+  if elapsed >= celebrateSeconds:
+    return None
+  return [bytes(round(255 * c) for c in colorsys.hsv_to_rgb((n / len(animation.ranges) - elapsed) % 1, 1, 1)) for n in range(len(animation.ranges))]
+
+def animatedFrames(currentDate):
+  ''' the frame buffer with the running animations drawn over it, dropping those that are over '''
+  frames = {channel : bytearray(pixels) for channel, pixels in ledOutput['pixels'].items()}
+  for key, animation in list(animations.items()):
+    frame = animationFrame(animation, (currentDate - animation.began).total_seconds())
+    if frame is None:
+      del animations[key]
+      continue
+    for (channel, start, length), color in zip(animation.ranges, frame):
+      pixels = frames[channel]
+      start = min(start, len(pixels) // 3)
+      end = min(start + length, len(pixels) // 3)
+      pixels[3*start:3*end] = color * (end - start)
+  metrics['animationFrames'] += 1
+  return frames
+
+def resync_ws281x():
+  ''' forget what ws2812svr is showing, so the next flush repaints every strip '''
+  ledOutput['shown'] = {}
+
+def diff_ws281x(pixels, shown):
+  ''' return (start, length, color) runs of the frame buffer that differ from what is shown '''
+  if shown is None:
+    spans = [(0, len(pixels) // 3)]
+  else:
+    ''' the changed pixels, found a whole strip at a time rather than comparing pixel by pixel '''
+    changes = (int.from_bytes(pixels, 'big') ^ int.from_bytes(shown, 'big')).to_bytes(len(pixels), 'big')
+    spans = []
+    for match in nonZeroBytes.finditer(changes):
+      start, end = match.start() // 3, (match.end() + 2) // 3
+      if spans and start <= spans[-1][1]:
+        spans[-1] = (spans[-1][0], end)
+      else:
+        spans.append((start, end))
+  runs = []
+  for pos, spanEnd in spans:
+    while pos < spanEnd:
+      color = pixels[3*pos:3*pos+3]
+      end = pos + 1
+      while end < spanEnd and pixels[3*end:3*end+3] == color:
+        end += 1
+      runs.append((pos, end - pos, color.hex().upper()))
+      pos = end
+  return runs
+# end of diff_ws281x():
+
+def flush_ws281x():
+  ''' send all queued commands and the changed ranges of each strip's frame buffer followed by one render '''
+  if ledOutput['overlay'] is not None:
+    frames = ledOutput['overlay']
+  elif animations:
+    frames = animatedFrames(clock.now())
+  else:
+    frames = ledOutput['pixels']
+  cmd = ''.join(ledOutput['batch'])
+  changed = []
+  for channel, pixels in frames.items():
+    shown = ledOutput['shown'].get(channel)
+    if pixels == shown:
+      continue
+    for start, length, color in diff_ws281x(pixels, shown):
+      cmd += 'fill ' + str(channel) + ',' + color + ',' + str(start) + ',' + str(length) + '\n'
+    ledOutput['shown'][channel] = bytearray(pixels)
+    changed.append(channel)
+    if logger.isEnabledFor(logging.DEBUG-5):
+      logger.log(logging.DEBUG-5, 'frame buffer of channel %d = %s', channel, pixels.hex())
+  if cmd:
+    ledOutput['batch'] = []
+    if len(frames) == 1:
+      cmd += 'render\n'
+    else:
+      ''' more than one strip, render the changed ones, or all of them when it was only commands such as brightness '''
+      cmd += ''.join('render ' + str(channel) + '\n' for channel in (changed or frames))
+    if write_ws281x(cmd):
+      ''' ws2812svr was restarted and lost the strip, repaint it all '''
+      resync_ws281x()
+      flush_ws281x()
+# end of flush_ws281x():
+
 def write_ws281x(cmd):
-  with open(args.ws281x, 'w') as the_file:
-    logger.log(logging.DEBUG-1, cmd.replace("\n", "\\n"))
-    the_file.write(cmd)
-    # file closes with unindent.
-    # close needed for ws2812svr to process file handle
+  ''' returns True if ws2812svr had to be reconnected and set up again '''
+  if logger.isEnabledFor(logging.DEBUG-1):
+    logger.log(logging.DEBUG-1, '%s', cmd.replace("\n", "\\n"))
+  reconnected = False
+  metrics['ledWrites'] += 1
+  metrics['ledBytes'] += len(cmd)
+  for attempt in range(2):
+    try:
+      if ledOutput['handle'] is None:
+        ledOutput['handle'] = open_ws281x()
+      ledOutput['handle'].write(cmd)
+      ledOutput['handle'].flush()
+      break
+    except OSError as e:
+      ''' ws2812svr went away (e.g. restarted), reconnect and try once more '''
+      logger.warning('ws281x write failed, reconnecting: %s', e)
+      close_ws281x()
+      if attempt:
+        raise
+      if ledOutput['isSetup']:
+        cmd = setupCommand() + cmd
+        reconnected = True
+        metrics['ledReconnects'] += 1
+  if args.ws281xClose:
+    # close needed for older ws2812svr's that only process the file handle on EOF
+    close_ws281x()
+  return reconnected
 # end of write_ws281x():
 
+def close_ws281x():
+  if ledOutput['handle'] is not None:
+    try:
+      ledOutput['handle'].close()
+    except OSError:
+      pass
+    ledOutput['handle'] = None
+
+#### Completion history, --history ####
+
+def historyLine(kind, section, when, *values):
+  return '\t'.join(['%.3f' % when.timestamp(), kind, section] + [str(x) for x in values]) + '\n'
+
+def recordHistory(kind, section, when, *values):
+  ''' queue a history line, written by the main loop's next flushHistory() '''
+  if args.history:
+    history['pending'].append(historyLine(kind, section, when, *values))
+
+def parseHistory(lines):
+  ''' yield (when, kind, section, values) from history lines, skipping torn or malformed ones '''
+  for line in lines:
+    try:
+      when, kind, section, *values = line.rstrip('\n').split('\t')
+      yield datetime.fromtimestamp(float(when)), kind, section, values
+    except ValueError:
+      logger.warning('skipping malformed history line %r', line)
+
+def replayHistory(currentDate):
+  ''' restore the tasks whose deadline window is still open to their last recorded state, then open the history for appending.
+  returns True if the history ends with a clean shutdown '''
+  if not args.history:
+    return False
+  clean = False
+  last = {} # section -> (when, state, PendingDueDate) of its last state change or snapshot
+  events = {} # section -> {'ButtonPresses' : [...], 'ButtonReleases' : [...]}
+  count = 0
+  try:
+    with open(args.history) as historyFile:
+      for when, kind, section, values in parseHistory(historyFile):
+        count += 1
+        clean = (kind == 'X')
+        if section not in tasks:
+          continue
+        buttonEvents = events.setdefault(section, {'ButtonPresses' : [], 'ButtonReleases' : []})
+        try:
+          if kind in ('S', 'C'):
+            last[section] = (when, values[0], datetime.fromtimestamp(int(values[1])))
+            if kind == 'C':
+              buttonEvents['ButtonReleases'].append(datetime.fromtimestamp(float(values[2])))
+          elif kind in ('P', 'R'):
+            buttonEvents['ButtonPresses' if kind == 'P' else 'ButtonReleases'].append(when)
+          elif kind == 'U':
+            buttonEvents['ButtonReleases'].clear() # a long press undid the completion
+        except (IndexError, ValueError):
+          logger.warning('skipping malformed history line of %s', section) # torn by a power loss, the rest still counts
+  except FileNotFoundError:
+    pass
+  except OSError as e:
+    logger.warning('unable to replay history %s: %s', args.history, e)
+
+  restored = 0
+  for section, (when, state, PendingDueDate) in last.items():
+    task = tasks[section]
+    if PendingDueDate + task.persist < currentDate:
+      continue # that window is over, loadTasks() has already moved on to the next deadline
+    if getNextDeadLine(PendingDueDate - timedelta(seconds = 1), task)[0] != PendingDueDate:
+      continue # the deadline was changed in the INI since
+    task.PendingDueDate, task.PendingGraceDate, task.PendingToLateDate = PendingDueDate, PendingDueDate - task.grace, PendingDueDate + task.persist
+    task.state = state
+    for buttonAction in ('ButtonPresses', 'ButtonReleases'):
+      setattr(task, buttonAction, ([task.PendingGraceDate - timedelta(seconds=1)] + events[section][buttonAction])[-4:])
+    if state == 'completed':
+      timing = pinTiming(task.gpio_pin)
+      timing['next allowed'] = max(timing['next allowed'], when + timedelta(seconds = args.buttonDelay))
+    restored += 1
+  logger.info('replayed %d history records from %s, restored %d tasks', count, args.history, restored)
+
+  history['records'] = count
+  history['synced'] = currentDate
+  if count > historyCompactRecords:
+    compactHistory(currentDate)
+  else:
+    openHistory()
+  return clean
+# end of replayHistory():
+
+def openHistory():
+  try:
+    torn = False
+    if os.path.exists(args.history):
+      with open(args.history, 'rb') as historyFile:
+        if historyFile.seek(0, os.SEEK_END) > 0:
+          historyFile.seek(-1, os.SEEK_END)
+          torn = historyFile.read(1) != b'\n'
+    history['handle'] = open(args.history, 'a')
+    if torn:
+      history['handle'].write('\n') # end a line cut off by a power loss, so the next record starts on its own
+  except OSError as e:
+    logger.warning('unable to open history %s: %s', args.history, e)
+
+def flushHistory(currentDate, sync = False):
+  ''' write the queued history lines, fsync at most every --historySync seconds unless sync, compact when it grew too long '''
+  if history['handle'] is None:
+    return
+  lines = []
+  while history['pending']:
+    lines.append(history['pending'].popleft())
+  try:
+    if lines:
+      history['handle'].write(''.join(lines))
+      history['handle'].flush()
+      history['records'] += len(lines)
+      history['dirty'] = True
+    if history['dirty'] and (sync or currentDate - history['synced'] >= timedelta(seconds = args.historySync)):
+      os.fsync(history['handle'].fileno())
+      history['dirty'] = False
+      history['synced'] = currentDate
+  except OSError as e:
+    logger.warning('history write failed: %s', e)
+  if not sync and history['records'] > historyCompactRecords:
+    compactHistory(currentDate)
+# end of flushHistory():
+
+def compactHistory(currentDate):
+  ''' move the live history onto the end of its gzip archive and restart it from a snapshot of the tasks '''
+  closeHistory()
+  logger.info('compacting %d history records of %s', history['records'], args.history)
+  try:
+    if os.path.exists(args.history):
+      with open(args.history, 'rb') as live, open(args.history + '.gz', 'ab') as archive:
+        import gzip # only needed once the history has grown long
+        with gzip.GzipFile(fileobj = archive, mode = 'ab') as gz: # concatenated gzip members read back as one stream
+          shutil.copyfileobj(live, gz)
+        archive.flush()
+        os.fsync(archive.fileno())
+
+    snapshot = [historyLine('C', section, currentDate, task.state, int(task.PendingDueDate.timestamp()), '%.3f' % task.ButtonReleases[-1].timestamp())
+                for section, task in tasks.items() if task.state is not None]
+    with open(args.history + '.tmp', 'w') as snapshotFile:
+      snapshotFile.write(''.join(snapshot))
+      snapshotFile.flush()
+      os.fsync(snapshotFile.fileno())
+    os.replace(args.history + '.tmp', args.history)
+    history['records'] = len(snapshot)
+  except OSError as e:
+    logger.warning('history compaction failed: %s', e)
+  history['synced'] = currentDate
+  openHistory()
+# end of compactHistory():
+
+def closeHistory(clean = False):
+  ''' flush and close the history, clean marks a shutdown that left nothing to test at the next start up '''
+  if history['handle'] is not None:
+    if clean:
+      recordHistory('X', '', clock.now())
+    flushHistory(clock.now(), sync = True)
+    history['handle'].close()
+    history['handle'] = None
+
+#### Status, --statusHttp ####
+
+def publishStatus(currentDate):
+  ''' hand the server thread a new snapshot, only references are taken here, formatting is left to the server '''
+  if status['server'] is None:
+    return
+  status['snapshot'] = {
+    'time' : currentDate,
+    'brightness' : int(ws281x['Brightness']),
+    'titles' : { title : { 'name' : config[title].get('name', '').strip('"'),
+                           'state' : config[title]['state'],
+                           'color' : config[title]['currentColor'],
+                           'channel' : config[title]['channel'] }
+                 for title in titles },
+    'tasks' : { section : { 'description' : task.description.strip('"'),
+                            'title' : task.title,
+                            'state' : task.state,
+                            'color' : task.currentColor,
+                            'gpio_pin' : task.gpio_pin,
+                            'next allowed' : buttonTiming[task.gpio_pin]['next allowed'] if task.gpio_pin in buttonTiming else None,
+                            'grace' : task.PendingGraceDate,
+                            'due' : task.PendingDueDate,
+                            'late' : task.PendingToLateDate,
+                            'presses' : task.pressCount,
+                            'releases' : task.releaseCount }
+                for section, task in tasks.items() } }
+
+def exportMetrics():
+  ''' metrics as plain JSON values '''
+  result = {}
+  for name, value in metrics.items():
+    if isinstance(value, Histogram):
+      value = {'count' : value.count, 'sum' : value.sum, 'buckets' : {str(bound) : count for bound, count in value.cumulative()}}
+    result[name] = value
+  result['logQueueDepth'] = logPipeline['queue'].qsize() if logPipeline['queue'] is not None else 0
+  return result
+
+def promLabel(value):
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheusText(snapshot):
+  ''' the snapshot and metrics in the Prometheus text exposition format '''
+  lines = []
+  def metric(name, kind, help, samples):
+    lines.append('# HELP choreboard_%s %s' % (name, help))
+    lines.append('# TYPE choreboard_%s %s' % (name, kind))
+    for labels, value in samples:
+      lines.append('choreboard_%s%s %s' % (name, '{' + ','.join('%s="%s"' % (k, promLabel(v)) for k, v in labels) + '}' if labels else '', value))
+
+  if snapshot is not None:
+    metric('title_complete', 'gauge', '1 when every chore of the title is done',
+           [((('title', title), ('name', values['name'])), int(values['state'] == 'complete')) for title, values in snapshot['titles'].items()])
+    taskItems = snapshot['tasks'].items()
+    metric('task_state', 'gauge', 'current state of each task', [((('task', section), ('state', task['state'])), 1) for section, task in taskItems])
+    metric('task_due_timestamp_seconds', 'gauge', 'pending deadline of each task', [((('task', section),), '%.0f' % task['due'].timestamp()) for section, task in taskItems])
+    metric('task_button_presses_total', 'counter', 'accepted presses since start up', [((('task', section),), task['presses']) for section, task in taskItems])
+    metric('task_button_releases_total', 'counter', 'accepted releases since start up', [((('task', section),), task['releases']) for section, task in taskItems])
+
+  metric('start_time_seconds', 'gauge', 'process start time', [((), '%.0f' % metrics['started'])])
+  metric('loop_passes_total', 'counter', 'main loop passes', [((), metrics['loopPasses'])])
+  metric('button_edges_total', 'counter', 'GPIO edges seen by the callback', [((), metrics['buttonEdges'])])
+  metric('led_writes_total', 'counter', 'writes to ws2812svr', [((), metrics['ledWrites'])])
+  metric('led_bytes_total', 'counter', 'bytes written to ws2812svr', [((), metrics['ledBytes'])])
+  metric('led_reconnects_total', 'counter', 'reconnections to ws2812svr', [((), metrics['ledReconnects'])])
+  metric('log_records_queued_total', 'counter', 'log records handed to the writer thread', [((), metrics['logQueued'])])
+  metric('log_records_dropped_total', 'counter', 'log records dropped as the writer thread fell behind', [((), metrics['logDropped'])])
+  metric('log_queue_depth', 'gauge', 'log records waiting for the writer thread', [((), logPipeline['queue'].qsize() if logPipeline['queue'] is not None else 0)])
+  metric('animation_frames_total', 'counter', 'LED frames composed while an animation ran', [((), metrics['animationFrames'])])
+  metric('cron_cache_hits_total', 'counter', 'deadlines answered from the occurrence cache', [((), metrics['cronHits'])])
+  metric('cron_cache_misses_total', 'counter', 'deadlines that had to be computed by CronTab', [((), metrics['cronMisses'])])
+  metric('button_bounces_total', 'counter', 'presses dropped as contact bounce', [((), metrics['buttonBounces'])])
+  for name, key, help in (('loop_seconds', 'loopSeconds', 'time spent per main loop pass'), ('callback_seconds', 'callbackSeconds', 'time spent per button callback'),
+                          ('edge_seconds', 'edgeSeconds', 'time from a button callback to the main loop applying its edge'),
+                          ('press_seconds', 'pressSeconds', 'how long buttons were held')):
+    histogram = metrics[key]
+    metric(name, 'histogram', help, [])
+    for bound, count in histogram.cumulative():
+      lines.append('choreboard_%s_bucket{le="%s"} %d' % (name, '+Inf' if bound == float('inf') else repr(bound), count))
+    lines.append('choreboard_%s_sum %r' % (name, histogram.sum))
+    lines.append('choreboard_%s_count %d' % (name, histogram.count))
+  return '\n'.join(lines) + '\n'
+# end of prometheusText():
+
+class StatusRequestHandler:
+  ''' serves the last published snapshot, never touches the live tasks. mixed into http.server's handler by
+  startStatusServer(), http.server is only imported with --statusHttp '''
+  timeout = 5 # a stuck client must not hold the server thread
+
+  def do_GET(self):
+    snapshot = status['snapshot']
+    path = self.path.split('?')[0]
+    if path in ('/', '/status', '/status.json'):
+      body = json.dumps({'status' : snapshot, 'metrics' : exportMetrics()}, default = lambda d: d.isoformat(), indent = 1)
+      contentType = 'application/json'
+    elif path == '/metrics':
+      body = prometheusText(snapshot)
+      contentType = 'text/plain; version=0.0.4'
+    else:
+      self.send_error(404)
+      return
+    body = body.encode()
+    self.send_response(200)
+    self.send_header('Content-Type', contentType)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    logger.log(logging.DEBUG-1, '%s %s', self.address_string(), format % args)
+# end of StatusRequestHandler:
+
+def startStatusServer():
+  ''' serve --statusHttp from a daemon thread '''
+  import http.server # pulls in email and http.client, slow to import and only needed here
+  host, _, port = args.statusHttp.rpartition(':')
+  handler = type('StatusRequestHandler', (StatusRequestHandler, http.server.BaseHTTPRequestHandler), {})
+  try:
+    status['server'] = http.server.HTTPServer((host or 'localhost', int(port)), handler)
+  except (OSError, ValueError) as e:
+    logger.warning('unable to serve status on %s: %s', args.statusHttp, e)
+    return
+  threading.Thread(target = status['server'].serve_forever, name = 'statusHttp', daemon = True).start()
+  logger.info('status served on http://%s:%s/status', host or 'localhost', port)
+
+#### Simulation, --simulate runs without a Pi, pigpiod or ws2812svr ####
+
+class SimulationEnd(Exception):
+  ''' the virtual clock ran past --simulateDays '''
+
+class RealClock:
+  ''' wall clock time '''
+  def now(self):
+    return datetime.now()
+
+  def sleep(self, seconds):
+    sleep(seconds)
+
+  def wait(self, edges, timeout):
+    ''' returns the first item put on the edges queue within timeout seconds, or None '''
+    try:
+      return edges.get(timeout = timeout)
+    except queue.Empty:
+      return None
+
+class VirtualClock:
+  ''' simulated time, jumps straight to the next timeout or scripted action instead of sleeping '''
+  def __init__(self, start, end):
+    self.current = start
+    self.end = end
+    self.actions = [] # heap of (when, sequence, action)
+    self.sequence = 0
+
+  def now(self):
+    return self.current
+
+  def at(self, when, action):
+    ''' run action() when the virtual time reaches when '''
+    self.sequence += 1
+    heapq.heappush(self.actions, (when, self.sequence, action))
+
+  def sleep(self, seconds):
+    self.wait(queue.SimpleQueue(), seconds)
+
+  def wait(self, edges, timeout):
+    ''' advance up to timeout seconds, returning early with the first item an action puts on edges '''
+    target = self.current + timedelta(seconds = timeout)
+    while edges.empty() and self.actions and self.actions[0][0] <= target:
+      when, _, action = heapq.heappop(self.actions)
+      self.current = max(self.current, when)
+      action()
+    if not edges.empty():
+      return edges.get_nowait()
+    self.current = target
+    if self.current > self.end:
+      raise SimulationEnd()
+    return None
+# end of VirtualClock:
+
+class ClockFilter(logging.Filter):
+  ''' stamp log records with the virtual time '''
+  def filter(self, record):
+    record.clock = clock.now().strftime('%Y-%m-%d %H:%M:%S')
+    return True
+
+def loadButtonScript(fileName):
+  ''' read --simulateButtons, returns a sorted list of (when, gpio_pin, level) '''
+  edges = []
+  if fileName is None:
+    return edges
+  with open(fileName) as script:
+    for line in script:
+      line = line.split('#')[0].strip()
+      if not line:
+        continue
+      *when, gpio, level = line.split()
+      if when[0].startswith('+'):
+        when = args.simulateStart + timedelta(seconds = float(when[0][1:]))
+      else:
+        when = datetime.strptime(' '.join(when), '%Y-%m-%d %H:%M:%S')
+      if level == 'press':
+        edges.append((when, int(gpio), 0))
+        edges.append((when + timedelta(seconds = 0.5), int(gpio), 1))
+      else:
+        edges.append((when, int(gpio), int(level)))
+  return sorted(edges)
+# end of loadButtonScript():
+
+class SimulatedCallback:
+  def __init__(self, pi, gpio, func):
+    self.pi, self.gpio, self.func = pi, gpio, func
+
+  def cancel(self):
+    self.pi.callbacks[self.gpio].remove(self.func)
+
+class SimulatedPi:
+  ''' in-process stand in for pigpio.pi(), replays the scripted button edges on the virtual clock '''
+  connected = True
+
+  def __init__(self):
+    self.levels = {}
+    self.callbacks = {}
+    for when, gpio, level in loadButtonScript(args.simulateButtons):
+      clock.at(when, lambda gpio=gpio, level=level: self.edge(gpio, level))
+
+  def set_mode(self, gpio, mode):
+    pass
+
+  def set_pull_up_down(self, gpio, pud):
+    self.levels.setdefault(gpio, 1)
+
+  def set_glitch_filter(self, gpio, steady):
+    pass
+
+  def read(self, gpio):
+    return self.levels.get(gpio, 1)
+
+  def read_bank_1(self):
+    bank = 0xFFFFFFFF # everything pulled up
+    for gpio, level in self.levels.items():
+      if not level:
+        bank &= ~(1 << gpio)
+    return bank
+
+  def callback(self, gpio, edge, func):
+    self.callbacks.setdefault(gpio, []).append(func)
+    return SimulatedCallback(self, gpio, func)
+
+  def edge(self, gpio, level):
+    self.levels[gpio] = level
+    tick = int(clock.now().timestamp() * 1000000) & 0xFFFFFFFF # pigpio ticks are 32 bit microseconds
+    for func in list(self.callbacks.get(gpio, ())):
+      func(gpio, level, tick)
+
+  def stop(self):
+    pass
+# end of SimulatedPi:
+
+class SimulatedPigpio:
+  ''' stands in for the pigpio module with --simulate '''
+  INPUT = 0
+  PUD_UP = 2
+  EITHER_EDGE = 2
+  pi = SimulatedPi
+
+class LedRecorder:
+  ''' in-memory ws2812svr for memory://, records every write with its (virtual) time '''
+  def __init__(self):
+    self.writes = []
+    self.bytes = 0
+
+  def write(self, cmd):
+    self.writes.append((clock.now(), cmd))
+    self.bytes += len(cmd)
+
+  def flush(self):
+    pass
+
+  def close(self):
+    pass
+
+def endSimulation():
+  recorder = ledOutput['recorder']
+  if recorder is not None:
+    logger.info('simulation ended, %d ws281x writes, %d bytes', len(recorder.writes), recorder.bytes)
+    if args.simulateOutput:
+      with open(args.simulateOutput, 'w') as output:
+        for when, cmd in recorder.writes:
+          output.write(when.strftime('%Y-%m-%d %H:%M:%S.%f') + '\t' + cmd.replace('\n', '\\n') + '\n')
+  else:
+    logger.info('simulation ended')
+# end of endSimulation():
+
 def signal_handler(signal, frame):
-  # handle ctrl+c gracefully
+  # handle ctrl+c and systemd stop gracefully
   logger.info("CTRL+C Exit LED test of ALL off")
-  write_ws281x('fill ' + str(ws281x['PWMchannel']) + ',' + colors['off'] + '\nrender\n')
+  ledOutput['overlay'] = None
+  animations.clear()
+  fill_ws281x(colors['off'])
+  flush_ws281x()
+  close_ws281x()
+  closeHistory(clean = True)
 
-  logger.info('Exiting script ' + os.path.join(os.path.dirname(os.path.realpath(__file__)), __file__))
+  logger.info('Exiting script %s', os.path.join(os.path.dirname(os.path.realpath(__file__)), __file__))
 
   sys.exit(0)
 # end of signal_handler():
 
-main()
+def reload_handler(signal, frame):
+  # SIGHUP, e.g. systemctl reload, the main loop does the reload as it owns the tasks, SimpleQueue.put() is safe in a signal handler
+  buttonEdges.put('reload')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+''' Benchmarks of choreBoard.py that run without a Pi, pigpiod or ws2812svr.
+
+Synthetic INI/IO files with hundreds to thousands of tasks are loaded as main() would, then the
+scheduler, the per task state machine, getNextDeadLine(), cbf_button(), the ws281x output and animations are
+timed against the in-memory stand ins used by --simulate. Results are printed and written as JSON.
+'''
+
+# python standard libraries
+import sys, os, argparse, logging, tempfile, json, platform, random, tracemalloc, resource, queue
+from datetime import datetime, timedelta
+from time import perf_counter
+
+import choreBoard
+
+benchStart = datetime(2026, 1, 5) # a Monday, so mon-fri schedules are live
+
+def writeSyntheticConfig(directory, taskCount):
+  ''' write an INI and IO pair with taskCount tasks spread over the day, returns their paths '''
+  iniFile = os.path.join(directory, 'bench%d.ini' % taskCount)
+  ioFile = os.path.join(directory, 'bench%d.io' % taskCount)
+  with open(iniFile, 'w') as ini, open(ioFile, 'w') as io:
+    ini.write('[Title 0]\nname = "Bench"\nnightbrightness = 10\nbrightness = 64\nlatitude = 42.36\nlongitude = -71.06\n\n')
+    io.write('[Title 0]\nled_start = 0\nled_length = 12\n\n')
+    for n in range(taskCount):
+      days = 'mon-fri' if n % 3 else '*'
+      ini.write('[task %d]\ndescription = "synthetic task %d"\ndeadline = 01:00:00; %d %d * * %s; 00:30:00\n\n' % (n, n, n % 60, 6 + n % 14, days))
+      io.write('[task %d]\nled_start = %d\nled_length = 5\ngpio_pin = %d\n\n' % (n, 12 + 5 * n, 2 + n % 26))
+  return iniFile, ioFile
+
+def setupBoard(configFile, ioFile, level):
+  ''' load the config and tasks as main() would, with LED output recorded in memory and logging at level '''
+  sys.argv = [sys.argv[0], '--config', configFile, '--io', ioFile, '--ws281x', 'memory://', '--configCache', '']
+  choreBoard.ParseArgs()
+  choreBoard.args.statusFile = None
+  choreBoard.args.history = None
+  choreBoard.clock = choreBoard.VirtualClock(benchStart, benchStart + timedelta(days = 365))
+
+  choreBoard.logger = logging.getLogger('choreBoardBench')
+  choreBoard.logger.propagate = False
+  if not choreBoard.logger.handlers:
+    choreBoard.logger.addHandler(logging.StreamHandler(open(os.devnull, 'w')))
+  choreBoard.logger.setLevel(level)
+
+  choreBoard.schedule.clear()
+  choreBoard.scheduled.clear()
+  choreBoard.buttonSections.clear()
+  choreBoard.buttonEdges = queue.SimpleQueue()
+  choreBoard.buttonLevels.clear()
+  choreBoard.buttonTiming.clear()
+  choreBoard.animations.clear()
+  choreBoard.ledOutput.update({'handle' : None, 'batch' : [], 'recorder' : None})
+
+  currentDate = choreBoard.clock.now()
+  choreBoard.config['Title 0']['dawn'], choreBoard.config['Title 0']['sunset'] = choreBoard.getSunUPandSunDown()
+  choreBoard.loadTasks(currentDate)
+  choreBoard.resetTitles(currentDate)
+  choreBoard.setup_ws281x()
+
+def timed(func):
+  ''' returns (func's result, seconds it took) '''
+  started = perf_counter()
+  result = func()
+  return result, perf_counter() - started
+
+def loadPeak(iniFile, ioFile, level):
+  ''' peak bytes allocated while loading the board, tracemalloc is too slow to leave on while timing '''
+  tracemalloc.start()
+  setupBoard(iniFile, ioFile, level)
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return peak
+
+def benchScheduler(days):
+  ''' run the event driven main loop over days of virtual time, as --simulate does '''
+  clock = choreBoard.clock
+  for section in choreBoard.tasks.keys():
+    choreBoard.armSchedule(section, clock.now())
+  choreBoard.armSchedule('Title 0', clock.now())
+  end = clock.now() + timedelta(days = days)
+  wakeups = 0
+  while choreBoard.schedule and choreBoard.schedule[0][0] < end:
+    clock.current = max(clock.current, choreBoard.schedule[0][0])
+    choreBoard.runSchedule(clock.current)
+    wakeups += 1
+  return wakeups
+
+def benchTicks(ticks):
+  ''' evaluate every task once per tick a minute apart, the cost of one pass of the old polling loop '''
+  currentDate = choreBoard.clock.now()
+  for tick in range(ticks):
+    for section in choreBoard.tasks.keys():
+      choreBoard.updateTask(section, currentDate)
+    for title in choreBoard.titles:
+      choreBoard.updateTitle(title)
+    choreBoard.flush_ws281x()
+    currentDate += timedelta(minutes = 1)
+  return ticks
+
+def benchDeadlines(rounds):
+  ''' getNextDeadLine() of every task from random times within a year '''
+  rng = random.Random(1)
+  tasks = list(choreBoard.tasks.values())
+  for n in range(rounds):
+    currentDate = benchStart + timedelta(seconds = rng.randrange(365 * 24 * 3600))
+    for task in tasks:
+      choreBoard.getNextDeadLine(currentDate, task)
+  return rounds * len(tasks)
+
+def benchButtons(rounds):
+  ''' press and release every button, rounds times, each edge queued by cbf_button(), applied and rendered '''
+  events = [(pin, level) for pin in choreBoard.buttonTasks.keys() for level in (0, 1)]
+  tick = 0
+  for n in range(rounds):
+    for pin, level in events:
+      tick = (tick + 250000) & 0xFFFFFFFF # a quarter second apart, past --debounce and --doublePress
+      choreBoard.cbf_button(pin, level, tick)
+      choreBoard.drainButtonEdges()
+      choreBoard.flush_ws281x()
+  return rounds * len(events)
+
+def benchRenders(renders, changed):
+  ''' recolour changed random tasks and render, returns (renders, bytes written) '''
+  rng = random.Random(1)
+  tasks = list(choreBoard.tasks.values())
+  palette = [choreBoard.colors[name] for name in ('off', 'ylw', 'red', 'grn')]
+  recorder = choreBoard.ledOutput['recorder']
+  before = recorder.bytes
+  for n in range(renders):
+    for task in rng.sample(tasks, min(changed, len(tasks))):
+      choreBoard.fill_ws281x(rng.choice(palette), task.led_start, task.led_length, task.channel)
+    choreBoard.flush_ws281x()
+  return renders, recorder.bytes - before
+
+def benchAnimations(frames, animated):
+  ''' pulse animated random tasks as late and render frames at 30 fps, returns (frames, bytes written) '''
+  rng = random.Random(1)
+  choreBoard.args.animate = 30
+  for task in rng.sample(list(choreBoard.tasks.values()), min(animated, len(choreBoard.tasks))):
+    task.state, task.currentColor = 'late', 'red'
+    choreBoard.animateTask(task.section)
+  recorder = choreBoard.ledOutput['recorder']
+  before = recorder.bytes
+  for n in range(frames):
+    choreBoard.clock.current += timedelta(seconds = 1 / choreBoard.args.animate)
+    choreBoard.flush_ws281x()
+  return frames, recorder.bytes - before
+
+def runSize(directory, taskCount, benchArgs):
+  ''' all benchmarks for one synthetic board size, returns a dict of results '''
+  iniFile, ioFile = writeSyntheticConfig(directory, taskCount)
+  level = getattr(logging, benchArgs.level)
+  results = {'tasks' : taskCount, 'load_peak_bytes' : loadPeak(iniFile, ioFile, level)}
+
+  setupBoard(iniFile, ioFile, level)
+  wakeups, elapsed = timed(lambda: benchScheduler(benchArgs.days))
+  results['scheduler'] = {'days' : benchArgs.days, 'wakeups' : wakeups, 'seconds' : elapsed,
+                          'simulated_days_per_sec' : benchArgs.days / elapsed}
+
+  setupBoard(iniFile, ioFile, level)
+  ticks, elapsed = timed(lambda: benchTicks(benchArgs.ticks))
+  results['state_machine'] = {'ticks' : ticks, 'ticks_per_sec' : ticks / elapsed}
+
+  setupBoard(iniFile, ioFile, level)
+  calls, elapsed = timed(lambda: benchDeadlines(benchArgs.rounds))
+  results['getNextDeadLine'] = {'calls' : calls, 'calls_per_sec' : calls / elapsed}
+
+  setupBoard(iniFile, ioFile, level)
+  events, elapsed = timed(lambda: benchButtons(benchArgs.rounds))
+  results['cbf_button'] = {'events' : events, 'events_per_sec' : events / elapsed, 'us_per_event' : elapsed / events * 1e6}
+
+  setupBoard(iniFile, ioFile, level)
+  (renders, written), elapsed = timed(lambda: benchRenders(benchArgs.renders, benchArgs.changed))
+  results['ws281x'] = {'renders' : renders, 'changed_tasks_per_render' : benchArgs.changed, 'renders_per_sec' : renders / elapsed,
+                       'bytes_per_render' : written / renders}
+
+  setupBoard(iniFile, ioFile, level)
+  (frames, written), elapsed = timed(lambda: benchAnimations(benchArgs.renders, benchArgs.changed))
+  results['animation'] = {'frames' : frames, 'pulsing_tasks' : benchArgs.changed, 'frames_per_sec' : frames / elapsed,
+                          'bytes_per_frame' : written / frames}
+
+  results['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # high water mark of the process so far
+  return results
+# end of runSize():
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark choreBoard.py without hardware.')
+  parser.add_argument('--tasks', '-t', help='comma separated synthetic board sizes', default='20,200,1000')
+  parser.add_argument('--days', help='virtual days for the scheduler benchmark', type=float, default=2)
+  parser.add_argument('--ticks', help='state machine passes over all tasks', type=int, default=200)
+  parser.add_argument('--rounds', '-n', help='rounds of getNextDeadLine() and button events', type=int, default=20)
+  parser.add_argument('--renders', help='renders for the ws281x benchmark', type=int, default=500)
+  parser.add_argument('--changed', help='tasks recoloured per render, and pulsed by the animation benchmark', type=int, default=4)
+  parser.add_argument('--level', '-l', help='logging level name to benchmark at', default='INFO')
+  parser.add_argument('--output', '-o', help='JSON results file', default='choreBoardBench.json')
+  benchArgs = parser.parse_args()
+
+  report = {'date' : datetime.now().isoformat(timespec = 'seconds'),
+            'python' : platform.python_version(),
+            'machine' : platform.machine(),
+            'level' : benchArgs.level,
+            'sizes' : []}
+
+  with tempfile.TemporaryDirectory() as directory:
+    for taskCount in [int(n) for n in benchArgs.tasks.split(',')]:
+      results = runSize(directory, taskCount, benchArgs)
+      report['sizes'].append(results)
+      print('%5d tasks: scheduler %8.2f days/s  state machine %8.1f ticks/s  getNextDeadLine %7.0f calls/s  cbf_button %8.0f events/s  ws281x %6.0f renders/s %6.1f bytes/render  animation %6.0f frames/s  load %7.0f KiB' % (
+            taskCount, results['scheduler']['simulated_days_per_sec'], results['state_machine']['ticks_per_sec'],
+            results['getNextDeadLine']['calls_per_sec'], results['cbf_button']['events_per_sec'],
+            results['ws281x']['renders_per_sec'], results['ws281x']['bytes_per_render'], results['animation']['frames_per_sec'],
+            results['load_peak_bytes'] / 1024))
+
+  with open(benchArgs.output, 'w') as output:
+    json.dump(report, output, indent=2)
+  print('results written to %s' % benchArgs.output)
+
+if __name__ == '__main__':
+  main()